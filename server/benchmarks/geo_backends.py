@@ -0,0 +1,72 @@
+"""
+Сравнение бэкендов геопоиска (ring и postgres) на одной БД
+
+Запуск из корня репозитория (переменные POSTGRES_* как у сервера,
+миграции применены):
+    python -m server.benchmarks.geo_backends
+
+Для каждой фикстуры печатает число найденных адресов каждым бэкендом,
+размер расхождения и медиану времени запроса.
+Результаты должны совпадать: оба бэкенда считают круг по большому кругу
+на сфере EARTH_RADIUS. Совпадение проверяют тесты tests/test_geo_backends.py.
+"""
+import statistics
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from server.core.db import SessionLocal
+from server.core.models import Address
+from server.core.utils.geo import POSTGRES_BACKEND, RING_BACKEND, circle_clause, frame_clause
+
+
+REPEATS = 20
+
+CIRCLES = [
+    (55.7558, 37.6173, 1000),
+    (55.7558, 37.6173, 20000),
+    (55.7558, 37.6173, 500000),
+    (0.0, 179.9, 100000),
+    (89.9, 0.0, 100000),
+]
+
+FRAMES = [
+    (55.5, 37.3, 56.0, 37.9),
+    (56.0, 37.9, 55.5, 37.3),
+    (10.0, 170.0, 20.0, -170.0),
+    (80.0, 0.0, 90.0, 10.0),
+    (-90.0, -180.0, 90.0, 180.0),
+]
+
+BACKENDS = [RING_BACKEND, POSTGRES_BACKEND]
+
+
+def measure(db, clause) -> tuple[set[int], float]:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        ids = {address_id for address_id, in db.query(Address.id).filter(clause)}
+        timings.append(time.perf_counter() - started)
+    return ids, statistics.median(timings)
+
+
+def run(db, name: str, build):
+    results = {backend: measure(db, build(backend)) for backend in BACKENDS}
+    (ring_ids, ring_time), (pg_ids, pg_time) = results[RING_BACKEND], results[POSTGRES_BACKEND]
+    print(
+        f"{name:<45} {len(ring_ids):>8} {len(pg_ids):>8} {len(ring_ids ^ pg_ids):>6}"
+        f" {ring_time * 1000:>10.2f} {pg_time * 1000:>10.2f}"
+    )
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"{'fixture':<45} {'ring':>8} {'postgres':>8} {'diff':>6} {'ring, ms':>10} {'pg, ms':>10}")
+        for x, y, r in CIRCLES:
+            run(db, f"circle {x}, {y}, r={r}", lambda backend: circle_clause(x, y, r, backend=backend))
+        for x1, y1, x2, y2 in FRAMES:
+            run(db, f"frame {x1}, {y1} - {x2}, {y2}", lambda backend: frame_clause(x1, y1, x2, y2, backend=backend))
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+"""
+Микробенчмарк EarthRing: скалярные методы против векторных (numpy)
+
+Запуск из корня репозитория:
+    python -m server.benchmarks.rings
+"""
+import time
+import numpy as np
+from server.core.utils.rings import EarthRing
+
+
+SIZES = [10_000, 100_000, 1_000_000]
+CENTER = (37.6173, 55.7558)
+RADIUS = 20000
+FRAME = ((37.3, 55.5), (37.9, 56.0))
+
+
+def random_points(n: int, seed: int = 42) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack((rng.uniform(-180, 180, n), rng.uniform(-90, 90, n)))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run(n: int):
+    earth = EarthRing()
+    points = random_points(n)
+    point_list = [tuple(p) for p in points.tolist()]
+
+    center = earth.to_flat(CENTER)
+    corner1, corner2 = earth.to_flat(FRAME[0]), earth.to_flat(FRAME[1])
+
+    flat_scalar, t_flat_scalar = timed(lambda: [earth.to_flat(p) for p in point_list])
+    flat_vector, t_flat_vector = timed(lambda: earth.to_flat_many(points))
+    assert np.array_equal(np.array(flat_scalar), flat_vector)
+
+    circle_scalar, t_circle_scalar = timed(
+        lambda: [earth.in_circle(a=p, r=RADIUS, center=center) for p in flat_scalar]
+    )
+    circle_vector, t_circle_vector = timed(
+        lambda: earth.in_circle_many(a=flat_vector, r=RADIUS, center=center)
+    )
+    assert np.array_equal(np.array(circle_scalar), circle_vector)
+
+    frame_scalar, t_frame_scalar = timed(
+        lambda: [earth.in_frame(a=corner1, c=p, b=corner2) for p in flat_scalar]
+    )
+    frame_vector, t_frame_vector = timed(
+        lambda: earth.in_frame_many(a=corner1, c=flat_vector, b=corner2)
+    )
+    assert np.array_equal(np.array(frame_scalar), frame_vector)
+
+    for name, scalar, vector in (
+        ("to_flat", t_flat_scalar, t_flat_vector),
+        ("in_circle", t_circle_scalar, t_circle_vector),
+        ("in_frame", t_frame_scalar, t_frame_vector),
+    ):
+        print(f"{n:>10} {name:<10} {scalar * 1000:>12.2f} {vector * 1000:>12.2f} {scalar / vector:>8.1f}x")
+
+
+if __name__ == "__main__":
+    print(f"{'points':>10} {'method':<10} {'scalar, ms':>12} {'vector, ms':>12} {'speedup':>9}")
+    for size in SIZES:
+        run(size)
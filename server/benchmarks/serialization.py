@@ -0,0 +1,114 @@
+"""
+Выдача списка предприятий: объекты ORM + EnterpriseResponseModel против колонок + EnterpriseRowEncoder
+
+Запуск из корня репозитория (переменные POSTGRES_* как у сервера,
+миграции применены, в БД не меньше ROWS предприятий):
+    python -m server.benchmarks.serialization
+
+Оба пути читают одни и те же ROWS предприятий по id. "orm" - как FastAPI
+отдавал список раньше: объекты с joinedload/selectinload, проверка и
+сериализация через response_model, JSONResponse. "rows" - enterprise_rows и
+EnterpriseRowEncoder. Печатает медиану времени запроса и кодирования для
+страницы JSON и для NDJSON и проверяет, что байты ответов совпадают.
+Затем то же для страниц "rows" с параметром fields из PROJECTIONS.
+"""
+import statistics
+import time
+from typing import List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from server.core.db import SessionLocal
+from server.core.models import Enterprise
+from server.core.routers.enterprise import get_enterprises_query
+from server.core.schemas.enterprise import EnterpriseResponseModel
+from server.core.utils.domain_tree import domain_tree
+from server.core.utils.enterprise_rows import ALL_FIELDS, EnterpriseRowEncoder, FieldSet, enterprise_rows
+
+
+ROWS = 100_000
+REPEATS = 5
+PROJECTIONS = ["id,name", "id,address.latitude,address.longitude", "id,domain"]
+
+# То же, что FastAPI делает с response_model=List[EnterpriseResponseModel]
+LIST_ADAPTER = TypeAdapter(List[EnterpriseResponseModel])
+
+
+def orm_page(items) -> bytes:
+    content = LIST_ADAPTER.dump_python(LIST_ADAPTER.validate_python(items, from_attributes=True), mode="json")
+    return JSONResponse(content).body
+
+
+def orm_ndjson(items) -> bytes:
+    return b"".join(EnterpriseResponseModel.model_validate(item).model_dump_json().encode() + b"\n" for item in items)
+
+
+def rows_page(db, rows, fields: FieldSet = ALL_FIELDS) -> bytes:
+    return EnterpriseRowEncoder(db, fields).page_response(rows, Response()).body
+
+
+def rows_ndjson(db, rows) -> bytes:
+    encode = EnterpriseRowEncoder(db).ndjson_line
+    return b"".join(encode(row) + b"\n" for row in rows)
+
+
+def measure(db, load, encode) -> tuple[bytes, int, float, float]:
+    load_times, encode_times = [], []
+    for _ in range(REPEATS):
+        # Каждый прогон с пустой identity map, как новый запрос
+        db.expunge_all()
+        started = time.perf_counter()
+        items = load()
+        loaded = time.perf_counter()
+        body = encode(items)
+        load_times.append(loaded - started)
+        encode_times.append(time.perf_counter() - loaded)
+    return body, len(items), statistics.median(load_times), statistics.median(encode_times)
+
+
+def run(db, rows: int = ROWS):
+    domain_tree.get(db)
+    orm_query = get_enterprises_query(db).order_by(Enterprise.id).limit(rows)
+    rows_query = enterprise_rows(get_enterprises_query(db)).order_by(Enterprise.id).limit(rows)
+
+    cases = [
+        ("page", "orm", lambda: orm_query.all(), orm_page),
+        ("page", "rows", lambda: rows_query.all(), lambda items: rows_page(db, items)),
+        ("ndjson", "orm", lambda: orm_query.all(), orm_ndjson),
+        ("ndjson", "rows", lambda: rows_query.all(), lambda items: rows_ndjson(db, items)),
+    ]
+
+    print(f"{'format':<8} {'path':<40} {'rows':>8} {'query, ms':>10} {'encode, ms':>11} {'total, ms':>10} {'bytes':>11}")
+    bodies = {}
+    for fmt, path, load, encode in cases:
+        body, count, load_time, encode_time = measure(db, load, encode)
+        bodies[(fmt, path)] = body
+        print(
+            f"{fmt:<8} {path:<40} {count:>8} {load_time * 1000:>10.1f}"
+            f" {encode_time * 1000:>11.1f} {(load_time + encode_time) * 1000:>10.1f} {len(body):>11}"
+        )
+
+    for spec in PROJECTIONS:
+        fields = FieldSet.parse(spec)
+        query = enterprise_rows(db.query(Enterprise), fields).order_by(Enterprise.id).limit(rows)
+        body, count, load_time, encode_time = measure(db, query.all, lambda items: rows_page(db, items, fields))
+        print(
+            f"{'page':<8} {spec:<40} {count:>8} {load_time * 1000:>10.1f}"
+            f" {encode_time * 1000:>11.1f} {(load_time + encode_time) * 1000:>10.1f} {len(body):>11}"
+        )
+
+    for fmt in ("page", "ndjson"):
+        same = bodies[(fmt, "orm")] == bodies[(fmt, "rows")]
+        print(f"{fmt}: bytes {'identical' if same else 'DIFFER'}")
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        run(db)
+    finally:
+        db.close()
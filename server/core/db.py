@@ -1,14 +1,21 @@
 import os
 from typing import Generator
-from sqlalchemy import create_engine
+from sqlalchemy import URL, create_engine
 from sqlalchemy.orm import sessionmaker, Session
 
 
 def _build_db_url() -> str:
-    return (
-        f"postgresql+psycopg2://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@"
-        f"{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
-    )
+    # Без переменных окружения адрес остается неполным, но модуль импортируется:
+    # соединение открывается только при первом запросе
+    port = os.getenv("POSTGRES_PORT")
+    return URL.create(
+        "postgresql+psycopg2",
+        username=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=int(port) if port else None,
+        database=os.getenv("POSTGRES_DB"),
+    ).render_as_string(hide_password=False)
 
 
 engine = create_engine(_build_db_url(), pool_pre_ping=True)
@@ -21,5 +28,3 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
-
-
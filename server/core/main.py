@@ -62,10 +62,56 @@ def init_test_data():
             pass
 
 
+def build_address_index():
+    """Построение пространственного индекса адресов"""
+    from server.core.utils.spatial_index import address_index
+
+    db = next(get_db())
+    try:
+        address_index.build(db)
+        stats = address_index.stats()
+        print(f"[OK] Геоиндекс построен: {stats['size']} адресов за {stats['build_time']:.3f} с")
+    except Exception as e:
+        print(f"[ERR] Ошибка построения геоиндекса: {e}")
+    finally:
+        db.close()
+
+
+def build_suggest_index():
+    """Построение индекса автодополнения по названиям"""
+    from server.core.utils.suggest import suggest_index
+
+    db = next(get_db())
+    try:
+        suggest_index.build(db)
+        stats = suggest_index.stats()
+        print(f"[OK] Индекс подсказок построен: {stats['size']} названий за {stats['build_time']:.3f} с")
+    except Exception as e:
+        print(f"[ERR] Ошибка построения индекса подсказок: {e}")
+    finally:
+        db.close()
+
+
+def read_table_versions():
+    """Первое чтение счетчиков таблиц: записи после него перестроят индексы процесса"""
+    from server.core.utils.etag import table_versions
+
+    db = next(get_db())
+    try:
+        table_versions.get(db)
+    except Exception as e:
+        print(f"[ERR] Ошибка чтения счетчиков таблиц: {e}")
+    finally:
+        db.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     run_migrations()
     init_test_data()
+    read_table_versions()
+    build_address_index()
+    build_suggest_index()
     yield
 
 
@@ -1,6 +1,7 @@
 from .enterprise import Enterprise, Phone
 from .domain import Domain
 from .address import Address
+from .table_version import TableVersion
 
 
-__all__ = ['Enterprise', 'Phone', 'Domain', 'Address']
+__all__ = ['Enterprise', 'Phone', 'Domain', 'Address', 'TableVersion']
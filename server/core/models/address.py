@@ -1,7 +1,8 @@
 from .base import *
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import Float
+from sqlalchemy import Float, event, inspect
 from typing import TYPE_CHECKING
+from ..utils.geocell import cell_of
 
 if TYPE_CHECKING:
     from server.core.models.enterprise import Enterprise
@@ -14,6 +15,8 @@ class Address(Base):
     address: Mapped[str] = mapped_column(String(length=255))
     latitude: Mapped[float] = mapped_column(Float)
     longitude: Mapped[float] = mapped_column(Float)
+    # Z-order ключ геоячейки, считается при записи (см. utils/geocell.py)
+    cell: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
 
     enterprises: Mapped[List["Enterprise"]] = relationship("Enterprise", back_populates="address")
 
@@ -21,8 +24,19 @@ class Address(Base):
         Index("idx_address_address", address),
         Index("idx_address_latitude", latitude),
         Index("idx_address_longitude", longitude),
+        Index("idx_address_cell", cell),
     )
 
     def __str__(self) -> str:
-        enterprises_count = len(self.enterprises) if self.enterprises else 0
+        # Незагруженную коллекцию не догружаем: строковое представление не ходит в БД
+        if "enterprises" in inspect(self).unloaded:
+            enterprises_count = "?"
+        else:
+            enterprises_count = len(self.enterprises)
         return f"Address(id={self.id}, address={self.address}, enterprises={enterprises_count})"
+
+
+@event.listens_for(Address, "before_insert")
+@event.listens_for(Address, "before_update")
+def set_address_cell(mapper, connection, target: Address):
+    target.cell = cell_of(target.latitude, target.longitude)
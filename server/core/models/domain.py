@@ -1,5 +1,11 @@
 from .base import *
+from sqlalchemy import ColumnElement, Select, and_, literal, select, update
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import object_session
+
+
+# Разделитель materialized path: "/1/5/12/" - корень 1, родитель 5, сам домен 12
+PATH_SEPARATOR = "/"
 
 
 class Domain(Base):
@@ -8,6 +14,9 @@ class Domain(Base):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(length=255), unique=True)
 
+    # id всех предков и самого домена, поддерживается роутерами в той же транзакции
+    path: Mapped[Optional[str]] = mapped_column(String(length=1024), nullable=True)
+
     enterprises: Mapped[List["Enterprise"]] = relationship("Enterprise", back_populates="domain")
 
     parent_id: Mapped[Optional[int]] = mapped_column(
@@ -28,38 +37,124 @@ class Domain(Base):
 
     __table_args__ = (
         Index("idx_domain_name", name),
+        Index("idx_domain_parent_id", parent_id),
+        Index("idx_domain_path", path, postgresql_ops={"path": "text_pattern_ops"}),
     )
 
+    @property
+    def ancestor_ids(self) -> List[int]:
+        """
+        id предков от корня к родителю
+        """
+        return [int(part) for part in self.path.strip(PATH_SEPARATOR).split(PATH_SEPARATOR)[:-1]]
 
     @hybrid_property
     def full_path(self) -> str:
-        parts = [self.name]
-        current = self.parent
-        while current:
-            parts.append(current.name)
-            current = current.parent
-        return " > ".join(parts[::-1])
+        session = object_session(self)
+        if session is None or self.path is None:
+            parts = [self.name]
+            current = self.parent
+            while current:
+                parts.append(current.name)
+                current = current.parent
+            return " > ".join(parts[::-1])
 
+        ancestor_ids = self.ancestor_ids
+        names = dict(session.execute(select(Domain.id, Domain.name).where(Domain.id.in_(ancestor_ids))).all())
+        return " > ".join([names[ancestor_id] for ancestor_id in ancestor_ids] + [self.name])
 
     @hybrid_property
     def children_count(self) -> int:
-        return len(self.children)
+        session = object_session(self)
+        if session is None:
+            return len(self.children)
+        return session.scalar(select(func.count()).where(Domain.parent_id == self.id))
 
     @hybrid_property
     def depth(self) -> int:
-        level = 0
-        current = self.parent
-        while current:
-            level += 1
-            current = current.parent
-        return level
+        if self.path is None:
+            level = 0
+            current = self.parent
+            while current:
+                level += 1
+                current = current.parent
+            return level
+
+        return self.path.count(PATH_SEPARATOR) - 2
+
+    @depth.inplace.expression
+    @classmethod
+    def _depth_expression(cls):
+        return func.length(cls.path) - func.length(func.replace(cls.path, PATH_SEPARATOR, "")) - 2
+
+    def subtree_clause(self, max_depth: Optional[int] = None) -> ColumnElement[bool]:
+        """
+        Условие "домен или его потомок" по префиксу path (индекс idx_domain_path).
+        max_depth ограничивает число уровней поддерева (сам домен - первый).
+        """
+        clause = Domain.path.startswith(self.path)
+        if max_depth is not None:
+            clause = and_(clause, Domain.depth < self.depth + max_depth)
+        return clause
+
+    def subtree_ids(self, max_depth: Optional[int] = None) -> Select:
+        return select(Domain.id).where(self.subtree_clause(max_depth))
 
     def get_all_descendants(self) -> List["Domain"]:
-        result = []
-        for child in self.children:
-            result.append(child)
-            result.extend(child.get_all_descendants())
-        return result
+        session = object_session(self)
+        if session is None or self.path is None:
+            result = []
+            for child in self.children:
+                result.append(child)
+                result.extend(child.get_all_descendants())
+            return result
+
+        return (
+            session.query(Domain)
+            .filter(self.subtree_clause(), Domain.id != self.id)
+            .order_by(Domain.path)
+            .all()
+        )
+
+    def sync_path(self):
+        """
+        Пересчитывает path домена и всех его потомков по текущему parent_id.
+        Вызывается после создания домена или смены родителя, в той же транзакции.
+        """
+        session = object_session(self)
+        session.flush()
+
+        parent_path = PATH_SEPARATOR
+        if self.parent_id is not None:
+            parent_path = session.scalar(select(Domain.path).where(Domain.id == self.parent_id))
+
+        new_path = f"{parent_path}{self.id}{PATH_SEPARATOR}"
+        if self.path is None:
+            self.path = new_path
+        elif self.path != new_path:
+            Domain.rewrite_paths(session, self.path, new_path)
+
+    def detach_children(self):
+        """
+        Перед удалением домена: его дети становятся корнями, пути поддеревьев укорачиваются
+        """
+        session = object_session(self)
+        session.flush()
+        Domain.rewrite_paths(session, self.path, PATH_SEPARATOR, exclude_id=self.id)
+
+    @staticmethod
+    def rewrite_paths(session, old_prefix: str, new_prefix: str, exclude_id: Optional[int] = None):
+        """
+        Заменяет префикс path у всего поддерева одним UPDATE
+        """
+        query = update(Domain).where(Domain.path.startswith(old_prefix))
+        if exclude_id is not None:
+            query = query.where(Domain.id != exclude_id)
+
+        session.execute(
+            query.values(path=literal(new_prefix) + func.substr(Domain.path, len(old_prefix) + 1)),
+            execution_options={"synchronize_session": "fetch"},
+        )
 
     def __str__(self) -> str:
         return f"Domain(id={self.id}, name={self.name}, parent_id={self.parent_id})"
@@ -1,4 +1,6 @@
 from .base import *
+from sqlalchemy import inspect
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 
 class Phone(Base):
@@ -8,6 +10,11 @@ class Phone(Base):
     enterprise_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("enterprises.id"))
     enterprise: Mapped["Enterprise"] = relationship("Enterprise", back_populates="phones")
 
+    __table_args__ = (
+        # Телефоны предприятия: selectinload, array_agg в списках и документ поиска
+        Index("idx_phone_enterprise_id", enterprise_id),
+    )
+
 
 class Enterprise(Base):
     __tablename__ = "enterprises"
@@ -27,11 +34,22 @@ class Enterprise(Base):
     )
     domain: Mapped[Optional["Domain"]] = relationship("Domain", back_populates="enterprises")
 
+    # Документ полнотекстового поиска, пересчитывается роутерами (см. utils/fts.py)
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True, deferred=True)
+
 
     __table_args__ = (
         Index("idx_enterprise_name", name),
+        Index("idx_enterprise_search_vector", search_vector, postgresql_using="gin"),
+        # Кандидаты геопоиска по id адресов из индекса в памяти, выборка и свертка по доменам
+        Index("idx_enterprise_address_id", address_id),
+        Index("idx_enterprise_domain_id", domain_id),
     )
 
     def __str__(self) -> str:
-        phones_str = ', '.join([p.phone for p in self.phones]) if self.phones else 'No phones'
+        # Незагруженную коллекцию не догружаем: строковое представление не ходит в БД
+        if "phones" in inspect(self).unloaded:
+            phones_str = 'not loaded'
+        else:
+            phones_str = ', '.join([p.phone for p in self.phones]) if self.phones else 'No phones'
         return f"Enterprise(id={self.id}, name={self.name}, phones=[{phones_str}])"
@@ -0,0 +1,14 @@
+from .base import *
+
+
+class TableVersion(Base):
+    """
+    Счетчик изменений таблицы: роутеры увеличивают его в транзакции каждой записи (см. utils/etag.py)
+    """
+    __tablename__ = "table_versions"
+
+    name: Mapped[str] = mapped_column(String(length=64), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+
+    def __str__(self) -> str:
+        return f"TableVersion(name={self.name}, version={self.version})"
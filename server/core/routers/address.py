@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Security
 from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
 from server.core.schemas.address import CreateAddressModel, AddressResponseModel, UpdateAddressModel
 from server.core.db import get_db
 from sqlalchemy.orm import Session
 from server.core.models.address import Address
+from server.core.models.enterprise import Enterprise
 from typing import List
 from server.core.security import verify_api_key
+from server.core.utils.etag import ADDRESSES_TABLE, addresses_etag, bump_versions, enterprises_etag
+from server.core.utils.fts import refresh_search_vectors
+from server.core.utils.geo_cache import geo_cache
+from server.core.utils.loaders import collection
+from server.core.utils.pagination import PageParams, SortKey, paginate
+from server.core.utils.spatial_index import address_index
 
 
 router = APIRouter(
@@ -27,10 +34,13 @@ class AddressNotFoundError(HTTPException):
 @router.get("", response_model=List[AddressResponseModel],
     summary="Список адресов")
 def list_addresses(
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(addresses_etag)
 ):
-    return db.query(Address).all()
+    return paginate(db.query(Address), page, response, SortKey(Address.id))
 
 
 @router.get("/{address_id}", response_model=AddressResponseModel,
@@ -38,7 +48,8 @@ def list_addresses(
 def retrieve_address(
     address_id: int,
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(addresses_etag)
 ):
     address = db.query(Address).filter(Address.id == address_id).first()
     if not address:
@@ -52,22 +63,26 @@ def retrieve_address(
 def get_enterprises_at_address(
     address_id: int,
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
-    from server.core.models.enterprise import Enterprise
-
     address = db.query(Address).filter(Address.id == address_id).first()
     if not address:
         raise AddressNotFoundError(address_id)
 
-    enterprises = db.query(Enterprise).filter(Enterprise.address_id == address_id).all()
+    enterprises = (
+        db.query(Enterprise)
+        .options(collection(Enterprise.phones))
+        .filter(Enterprise.address_id == address_id)
+        .all()
+    )
 
     return [
         {
             "id": ent.id,
             "name": ent.name,
             "domain_id": ent.domain_id,
-            "phones": [phone.phone for phone in ent.phones] if ent.phones else []
+            "phones": [phone.phone for phone in ent.phones]
         }
         for ent in enterprises
     ]
@@ -84,8 +99,11 @@ def create_addresses(
     try:
         address = Address(address=payload.address, latitude=payload.latitude, longitude=payload.longitude)
         db.add(address)
+        bump_versions(db, ADDRESSES_TABLE)
         db.commit()
         db.refresh(address)
+        address_index.upsert(address.id, address.latitude, address.longitude)
+        geo_cache.invalidate_point(address.latitude, address.longitude)
         return address
     except Exception as e:
         db.rollback()
@@ -104,12 +122,19 @@ def replace_address(
     if not address:
         raise AddressNotFoundError(address_id)
 
+    # Старые координаты: кэш геопоиска сбрасывается и там, откуда адрес ушел
+    old_point = (address.latitude, address.longitude)
     try:
         address.address = payload.address
         address.latitude = payload.latitude
         address.longitude = payload.longitude
+        refresh_search_vectors(db, Enterprise.address_id == address_id)
+        bump_versions(db, ADDRESSES_TABLE)
         db.commit()
         db.refresh(address)
+        address_index.upsert(address.id, address.latitude, address.longitude)
+        geo_cache.invalidate_point(*old_point)
+        geo_cache.invalidate_point(address.latitude, address.longitude)
         return address
     except Exception as e:
         db.rollback()
@@ -127,11 +152,17 @@ def update_address(
     if not address:
         raise AddressNotFoundError(address_id)
 
+    old_point = (address.latitude, address.longitude)
     try:
         for field, value in payload.model_dump(exclude_unset=True).items():
             setattr(address, field, value)
+        refresh_search_vectors(db, Enterprise.address_id == address_id)
+        bump_versions(db, ADDRESSES_TABLE)
         db.commit()
         db.refresh(address)
+        address_index.upsert(address.id, address.latitude, address.longitude)
+        geo_cache.invalidate_point(*old_point)
+        geo_cache.invalidate_point(address.latitude, address.longitude)
         return address
     except Exception as e:
         db.rollback()
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Security
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import List, Optional
 from server.core.schemas.domain import *
-from server.core.models.domain import Domain
+from server.core.models import Address, Domain, Enterprise
 from server.core.db import get_db
+from server.core.routers.enterprise import MAX_LATITUDE, MAX_LONGITUDE
 from server.core.security import verify_api_key
+from server.core.utils.domain_tree import domain_tree
+from server.core.utils.etag import DOMAIN_TABLE, bump_versions, domains_etag, enterprises_etag
+from server.core.utils.fts import refresh_search_vectors
+from server.core.utils.geo import frame_clause
+from server.core.utils.pagination import PageParams, paginate_items
+from server.core.utils.suggest import DOMAIN_KIND, suggest_index
 
 
 # Константы
@@ -36,28 +44,121 @@ class DomainDepthExceededError(HTTPException):
         )
 
 
-def calculate_depth(domain_id: int, db: Session) -> int:
-    depth = 0
-    current_id = domain_id
-    while current_id:
-        domain = db.query(Domain).filter(Domain.id == current_id).first()
-        if not domain:
-            break
-        current_id = domain.parent_id
-        depth += 1
-        if depth > MAX_DEPTH:
-            break
-    return depth
+class DomainCycleError(HTTPException):
+    """Исключение для переноса домена внутрь собственного поддерева"""
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Domain cannot be moved under itself or its descendant"
+        )
+
+
+def validate_parent(parent_id: Optional[int], db: Session, domain: Optional[Domain] = None):
+    """
+    Проверка нового родителя одним запросом по path: цепочка предков родителя,
+    высота переносимого поддерева и цикл (родитель внутри поддерева домена)
+    """
+    if parent_id is None:
+        return
+
+    query = select(Domain.path, Domain.depth).where(Domain.id == parent_id)
+    moved = domain is not None and domain.path is not None
+    if moved:
+        subtree_depth = select(func.max(Domain.depth)).where(Domain.path.startswith(domain.path)).scalar_subquery()
+        query = query.add_columns(subtree_depth)
+
+    row = db.execute(query).first()
+    if row is None:
+        raise DomainNotFoundError(parent_id)
+
+    parent_path, parent_depth = row[0], row[1]
+    # path пуст только у доменов, оставшихся в цикле до миграции
+    if parent_path is None:
+        raise DomainCycleError()
+
+    height = 1
+    if moved:
+        if parent_path.startswith(domain.path):
+            raise DomainCycleError()
+        height = row[2] - domain.depth + 1
+
+    # Глубина родителя (от 0) + 1 - число уровней до него включительно
+    if parent_depth + 1 + height > MAX_DEPTH:
+        raise DomainDepthExceededError()
 
 
 @router.get("", response_model=List[DomainBaseResponseModel],
     summary="Список доменов",
     description="Получить список всех видов деятельности")
 def list_domains(
+    response: Response,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(domains_etag)
+):
+    tree = domain_tree.get(db)
+    nodes = paginate_items(list(tree.nodes.values()), page, response, key=lambda node: node.id)
+    return [tree.as_dict(node) for node in nodes]
+
+
+@router.get("/rollup", response_model=List[DomainRollupResponseModel],
+    summary="Дерево доменов со счетчиками",
+    description="""
+Все дерево доменов с числом предприятий в самом домене (direct_count)
+и во всем его поддереве (subtree_count). Считается одним агрегирующим запросом.
+
+Необязательные фильтры: область x1, y1, x2, y2 (правила как у `/enterprises/in_frame/`)
+и часть названия предприятия q.
+    """)
+def get_domain_rollup(
+    x1: Optional[float] = Query(None, ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y1: Optional[float] = Query(None, ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    x2: Optional[float] = Query(None, ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y2: Optional[float] = Query(None, ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    q: Optional[str] = None,
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
-    return db.query(Domain).all()
+    frame = [x1, y1, x2, y2]
+    if any(v is not None for v in frame) and any(v is None for v in frame):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Frame needs all of x1, y1, x2, y2")
+
+    counts = db.query(Enterprise.domain_id, func.count(Enterprise.id).label("count")).filter(Enterprise.domain_id.isnot(None))
+    if x1 is not None:
+        counts = counts.join(Address).filter(frame_clause(x1, y1, x2, y2))
+    if q:
+        counts = counts.filter(Enterprise.name.ilike(f"%{q}%"))
+    counts = counts.group_by(Enterprise.domain_id).subquery()
+
+    # Каждый домен соединяется со всеми доменами своего поддерева по префиксу path
+    descendant = aliased(Domain)
+    rows = (
+        db.query(
+            Domain.id,
+            Domain.name,
+            Domain.parent_id,
+            func.coalesce(func.sum(case((descendant.id == Domain.id, counts.c.count))), 0),
+            func.coalesce(func.sum(counts.c.count), 0),
+        )
+        .outerjoin(descendant, descendant.path.startswith(Domain.path))
+        .outerjoin(counts, counts.c.domain_id == descendant.id)
+        .group_by(Domain.id, Domain.name, Domain.parent_id)
+        .order_by(Domain.id)
+        .all()
+    )
+
+    nodes = {
+        domain_id: {"id": domain_id, "name": name, "parent_id": parent_id,
+                    "direct_count": direct, "subtree_count": subtree, "children": []}
+        for domain_id, name, parent_id, direct, subtree in rows
+    }
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+    return roots
 
 
 @router.get("/{domain_id}", response_model=DomainResponseModel,
@@ -65,9 +166,10 @@ def list_domains(
 def retrieve_domain(
     domain_id: int,
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(domains_etag)
 ):
-    domain = db.query(Domain).filter(Domain.id == domain_id).first()
+    domain = domain_tree.get(db).describe(domain_id)
     if not domain:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Domain not found")
     return domain
@@ -81,15 +183,19 @@ def create_domain(
     db: Session = Depends(get_db),
     api_key: str = Security(verify_api_key)
 ):
-    if payload.parent_id and calculate_depth(payload.parent_id, db) >= MAX_DEPTH:
-        raise DomainDepthExceededError()
+    validate_parent(payload.parent_id, db)
 
     try:
         domain = Domain(**payload.model_dump(exclude_unset=True))
         db.add(domain)
+        domain.sync_path()
+        bump_versions(db, DOMAIN_TABLE)
         db.commit()
-        db.refresh(domain)
-        return domain
+        domain_tree.bump()
+        suggest_index.upsert(DOMAIN_KIND, domain.id, domain.name)
+        # Ответ из снимка дерева: один запрос вместо ленивой загрузки родителей
+        tree = domain_tree.get(db)
+        return tree.as_dict(tree.get(domain.id))
     except IntegrityError as e:
         db.rollback()
         if 'unique constraint' in str(e).lower():
@@ -109,12 +215,20 @@ def replace_domain(
     if not domain:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Domain not found")
 
+    if payload.parent_id != domain.parent_id:
+        validate_parent(payload.parent_id, db, domain)
+
     for field, value in payload.model_dump().items():
         setattr(domain, field, value)
 
+    domain.sync_path()
+    refresh_search_vectors(db, Enterprise.domain_id.in_(domain.subtree_ids()))
+    bump_versions(db, DOMAIN_TABLE)
     db.commit()
-    db.refresh(domain)
-    return domain
+    domain_tree.bump()
+    suggest_index.upsert(DOMAIN_KIND, domain.id, domain.name)
+    # Родители и дети из снимка дерева, без ленивой загрузки по уровням
+    return domain_tree.get(db).describe(domain_id)
 
 
 @router.patch("/{domain_id}", response_model=DomainResponseModel,
@@ -130,15 +244,20 @@ def update_domain(
         raise DomainNotFoundError(domain_id)
 
     data = payload.model_dump(exclude_unset=True)
-    if 'parent_id' in data and data['parent_id'] and calculate_depth(data['parent_id'], db) >= MAX_DEPTH:
-        raise DomainDepthExceededError()
+    if 'parent_id' in data and data['parent_id'] != domain.parent_id:
+        validate_parent(data['parent_id'], db, domain)
 
     try:
         for field, value in data.items():
             setattr(domain, field, value)
+        if 'parent_id' in data:
+            domain.sync_path()
+        refresh_search_vectors(db, Enterprise.domain_id.in_(domain.subtree_ids()))
+        bump_versions(db, DOMAIN_TABLE)
         db.commit()
-        db.refresh(domain)
-        return domain
+        domain_tree.bump()
+        suggest_index.upsert(DOMAIN_KIND, domain.id, domain.name)
+        return domain_tree.get(db).describe(domain_id)
     except IntegrityError as e:
         db.rollback()
         if 'unique constraint' in str(e).lower():
@@ -156,5 +275,11 @@ def delete_domain(
     domain = db.query(Domain).filter(Domain.id == domain_id).first()
     if not domain:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Domain not found")
+    subtree_ids = db.scalars(domain.subtree_ids()).all()
+    domain.detach_children()
     db.delete(domain)
+    refresh_search_vectors(db, Enterprise.domain_id.in_(subtree_ids))
+    bump_versions(db, DOMAIN_TABLE)
     db.commit()
+    domain_tree.bump()
+    suggest_index.remove(DOMAIN_KIND, domain_id)
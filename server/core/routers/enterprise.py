@@ -1,15 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session, joinedload
+import math
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Security
+from sqlalchemy import func
+from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from typing import List
 from server.core.schemas.enterprise import (
     CreateEnterpriseModel,
+    CircleAreaModel,
+    ClusterResponseModel,
     EnterpriseResponseModel,
+    GeoBatchRequestModel,
+    GeoBatchResponseModel,
+    NearestEnterpriseResponseModel,
+    PolygonModel,
+    SuggestResponseModel,
     UpdateEnterpriseModel,
 )
 from server.core.models import Enterprise, Address, Phone
 from server.core.db import get_db
-from server.core.utils.rings import EarthRing
+from server.core.utils.geo import (
+    GEO_BACKEND,
+    RING_BACKEND,
+    cap_clause,
+    cells_clause,
+    circle_boxes,
+    circle_clause,
+    cluster_columns,
+    frame_boxes,
+    frame_clause,
+    polygon_boxes,
+)
+from server.core.utils.rings import EARTH_RADIUS, EarthRing
+from server.core.utils.domain_tree import domain_tree
+from server.core.utils.enterprise_rows import (
+    EnterpriseRowEncoder,
+    FieldSet,
+    carried_headers,
+    enterprise_rows,
+    json_response,
+    parse_fields,
+)
+from server.core.utils.etag import ADDRESSES_TABLE, ENTERPRISES_TABLE, bump_versions, enterprises_etag
+from server.core.utils.fts import refresh_search_vectors, search_query
+from server.core.utils.geo_cache import CIRCLE_KIND, FRAME_KIND, GeoArea, geo_cache
+from server.core.utils.loaders import enterprise_options
+from server.core.utils.pagination import PageParams, SortKey, order_clauses, paginate, paginate_items
+from server.core.utils.spatial_index import address_index
+from server.core.utils.streaming import stream_ndjson
+from server.core.utils.suggest import ENTERPRISE_KIND, SUGGEST_LIMIT, SUGGEST_MAX_LIMIT, suggest_index
 from server.core.security import verify_api_key
 
 
@@ -17,6 +56,15 @@ from server.core.security import verify_api_key
 HTTP_404_NOT_FOUND = status.HTTP_404_NOT_FOUND
 HTTP_400_BAD_REQUEST = status.HTTP_400_BAD_REQUEST
 HTTP_409_CONFLICT = status.HTTP_409_CONFLICT
+NEAREST_START_RADIUS = 1000
+NEAREST_MAX_K = 100
+# Ячеек кластеризации на сторону тайла карты
+CLUSTER_CELLS_PER_TILE = 8
+CLUSTER_MAX_ZOOM = 22
+# Бюджет диапазонов геоячеек на весь пакет областей
+GEO_BATCH_MAX_CELL_RANGES = 256
+MAX_LATITUDE = 90
+MAX_LONGITUDE = 180
 
 router = APIRouter(
     prefix="/enterprises",
@@ -43,41 +91,200 @@ class DuplicateEnterpriseError(HTTPException):
         )
 
 
+ENTERPRISE_PAGE_KEY = SortKey(Enterprise.id)
+STREAM_DESCRIPTION = "Отдать все найденные предприятия потоком NDJSON (по объекту на строку) вместо страницы"
+
+
 def get_enterprises_query(db: Session):
-    return db.query(Enterprise).options(
-        joinedload(Enterprise.address),
-        joinedload(Enterprise.domain),
-        joinedload(Enterprise.phones),
-    )
+    # Объекты ORM со всеми связями - для ответов с одним предприятием; списки идут через enterprise_rows
+    return db.query(Enterprise).join(Enterprise.address).options(*enterprise_options(address_joined=True))
+
+
+def get_enterprise(db: Session, enterprise_id: int) -> Enterprise:
+    """
+    Предприятие со всеми связями для ответа после записи
+    """
+    return get_enterprises_query(db).filter(Enterprise.id == enterprise_id).one()
+
+
+def similarity_key(column, q: str) -> SortKey:
+    """
+    Ранг по триграммной схожести (pg_trgm), лучшие совпадения первыми
+    """
+    return SortKey(func.similarity(column, q), descending=True, computed=True)
+
+
+def page_or_stream(
+    query,
+    page: PageParams,
+    response: Response,
+    stream: bool,
+    fields: FieldSet,
+    *keys: SortKey,
+    address_joined: bool = False,
+):
+    """
+    Страница по курсору или, если stream=true, все строки потоком NDJSON.
+    По умолчанию порядок по id.
+    Строки читаются колонками полей fields и кодируются EnterpriseRowEncoder, минуя ORM и response_model.
+    address_joined - запрос уже присоединил адрес для своих условий.
+    """
+    keys = keys or (ENTERPRISE_PAGE_KEY,)
+    rows = enterprise_rows(query, fields, address_joined)
+    if stream:
+        return stream_ndjson(
+            rows.order_by(*order_clauses(keys)),
+            lambda db: EnterpriseRowEncoder(db, fields).ndjson_line,
+            headers=carried_headers(response),
+        )
+    return EnterpriseRowEncoder(query.session, fields).page_response(paginate(rows, page, response, *keys), response)
+
+def area_query(db: Session, area: GeoArea):
+    """
+    Запрос предприятий в круге или рамке и признак, присоединен ли к нему адрес
+    """
+    if GEO_BACKEND == RING_BACKEND and address_index.ready:
+        if area.kind == CIRCLE_KIND:
+            address_ids = address_index.in_circle(*area.params)
+        else:
+            address_ids = address_index.in_frame(*area.params)
+        return db.query(Enterprise).filter(Enterprise.address_id.in_(address_ids)), False
+
+    clause = circle_clause(*area.params) if area.kind == CIRCLE_KIND else frame_clause(*area.params)
+    return db.query(Enterprise).join(Enterprise.address).filter(clause), True
+
+
+def geo_page_or_stream(db: Session, area: GeoArea, page: PageParams, response: Response, stream: bool, fields: FieldSet):
+    """
+    page_or_stream для геопоиска: id найденных предприятий берутся из geo_cache,
+    и страница читается по первичному ключу. Поток и слишком большие результаты идут мимо кэша.
+    """
+    ids = None
+    if not stream and geo_cache.enabled:
+        def load(cover: GeoArea, limit: int) -> list[tuple[int, float, float]]:
+            query, address_joined = area_query(db, cover)
+            if not address_joined:
+                query = query.join(Enterprise.address)
+            return (
+                query.with_entities(Enterprise.id, Address.latitude, Address.longitude)
+                .order_by(Enterprise.id)
+                .limit(limit)
+                .all()
+            )
+
+        ids = geo_cache.ids(area, load)
+
+    if ids is None:
+        query, address_joined = area_query(db, area)
+        return page_or_stream(query, page, response, stream, fields, address_joined=address_joined)
+
+    page_ids = paginate_items(ids, page, response, key=int)
+    rows = enterprise_rows(db.query(Enterprise), fields).filter(Enterprise.id.in_(page_ids)).order_by(Enterprise.id)
+    return EnterpriseRowEncoder(db, fields).page_response(rows.all(), response)
+
 
 @router.get("", response_model=List[EnterpriseResponseModel], summary="Список всех предприятий")
 def get_enterprises(
+    response: Response,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
-    return get_enterprises_query(db).all()
+    return page_or_stream(db.query(Enterprise), page, response, stream, fields)
 
 
 @router.get("/search/", response_model=List[EnterpriseResponseModel],
     summary="Поиск предприятий по названию",
-    description="Поиск предприятий по частичному совпадению в названии (регистр не важен)")
+    description="Поиск предприятий по частичному совпадению в названии (регистр не важен). Сначала самые похожие")
 def search_enterprises(
     q: str,
+    response: Response,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
-    return get_enterprises_query(db).filter(Enterprise.name.ilike(f"%{q}%")).all()
+    # ILIKE и similarity идут по GIN индексу idx_enterprise_name_trgm
+    query = db.query(Enterprise).filter(Enterprise.name.ilike(f"%{q}%"))
+    return page_or_stream(query, page, response, stream, fields, similarity_key(Enterprise.name, q), ENTERPRISE_PAGE_KEY)
 
 
 @router.get("/with_address/", response_model=List[EnterpriseResponseModel],
     summary="Поиск предприятий по адресу",
-    description="Поиск предприятий по частичному совпадению в адресе")
+    description="Поиск предприятий по частичному совпадению в адресе (регистр не важен). Сначала самые похожие")
 def get_enterprises_by_address(
     q: str,
+    response: Response,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
+):
+    # ILIKE и similarity идут по GIN индексу idx_address_address_trgm
+    query = db.query(Enterprise).join(Enterprise.address).filter(Address.address.ilike(f"%{q}%"))
+    return page_or_stream(
+        query, page, response, stream, fields, similarity_key(Address.address, q), ENTERPRISE_PAGE_KEY,
+        address_joined=True,
+    )
+
+
+@router.get("/suggest/", response_model=List[SuggestResponseModel],
+    summary="Подсказки по префиксу",
+    description="""
+Автодополнение для строки поиска: до limit пар (id, название) предприятий и доменов,
+в названии которых какое-либо слово начинается с prefix (регистр не важен).
+Отвечает из индекса в памяти, без запроса в БД.
+    """)
+def suggest_names(
+    prefix: str,
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=SUGGEST_MAX_LIMIT),
     db: Session = Depends(get_db),
     api_key: str = Security(verify_api_key)
 ):
-    return get_enterprises_query(db).join(Address).filter(Address.address.ilike(f"%{q}%")).all()
+    if suggest_index.ready:
+        return suggest_index.suggest(prefix, limit)
+
+    # Индекс еще не построен: только названия предприятий, с начала строки
+    rows = (
+        db.query(Enterprise.id, Enterprise.name)
+        .filter(Enterprise.name.ilike(f"{prefix}%"))
+        .order_by(Enterprise.name)
+        .limit(limit)
+        .all()
+    )
+    return [{"kind": ENTERPRISE_KIND, "id": item_id, "name": name} for item_id, name in rows]
+
+
+@router.get("/fts/", response_model=List[EnterpriseResponseModel],
+    summary="Полнотекстовый поиск",
+    description="""
+Ищет сразу по названию, адресу, пути домена и цифрам телефонов, например `колбасы Ленина`.
+
+Слова ищутся с учетом морфологии (русская конфигурация), поддерживается синтаксис
+веб-поиска: `"точная фраза"`, `-исключить`, `or`. Сначала самые релевантные.
+    """)
+def full_text_search_enterprises(
+    q: str,
+    response: Response,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
+):
+    tsquery = search_query(q)
+    rank = SortKey(func.ts_rank_cd(Enterprise.search_vector, tsquery), descending=True, computed=True)
+    # Совпадение по GIN индексу idx_enterprise_search_vector
+    query = db.query(Enterprise).filter(Enterprise.search_vector.op("@@")(tsquery))
+    return page_or_stream(query, page, response, stream, fields, rank, ENTERPRISE_PAGE_KEY)
 
 
 @router.get("/at_address/{address_id}", response_model=List[EnterpriseResponseModel],
@@ -85,62 +292,281 @@ def get_enterprises_by_address(
     description="Получить список всех организаций находящихся по конкретному адресу")
 def get_enterprises_at_address(
     address_id: int,
+    response: Response,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
     address = db.query(Address).filter(Address.id == address_id).first()
     if not address:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=f"Address {address_id} not found")
 
-    return get_enterprises_query(db).filter(Enterprise.address_id == address_id).all()
+    query = db.query(Enterprise).filter(Enterprise.address_id == address_id)
+    return page_or_stream(query, page, response, stream, fields)
 
 
 @router.get("/in_circle/", response_model=List[EnterpriseResponseModel],
     summary="Поиск в радиусе",
     description="Находит все предприятия в заданном радиусе от точки с координатами (x, y)")
 def get_enterprises_in_circle(
-    x: float,
-    y: float,
-    r: float,
+    response: Response,
+    x: float = Query(..., ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y: float = Query(..., ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    r: float = Query(..., ge=0),
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
-    earth = EarthRing()
-    center = earth.to_flat((x, y))
-    all_enterprises = get_enterprises_query(db).all()
-
-    result = []
-    for ent in all_enterprises:
-        point = earth.to_flat((ent.address.latitude, ent.address.longitude))
-        if earth.in_circle(a=point, r=r, center=center):
-            result.append(ent)
-    return result
+    area = GeoArea(CIRCLE_KIND, (x, y, r))
+    return geo_page_or_stream(db, area, page, response, stream, fields)
 
 
 @router.get("/in_frame/", response_model=List[EnterpriseResponseModel],
     summary="Поиск в области",
-    description="Находит все предприятия в прямоугольной области между двумя точками")
+    description="""
+Находит все предприятия в прямоугольной области между двумя точками.
+
+Долгота отсчитывается с запада на восток от (x1, y1) к (x2, y2):
+если y1 > y2, область пересекает 180-й меридиан.
+    """)
 def get_enterprises_in_frame(
-    x1: float,
-    y1: float,
-    x2: float,
-    y2: float,
+    response: Response,
+    x1: float = Query(..., ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y1: float = Query(..., ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    x2: float = Query(..., ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y2: float = Query(..., ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
+):
+    area = GeoArea(FRAME_KIND, (x1, y1, x2, y2))
+    return geo_page_or_stream(db, area, page, response, stream, fields)
+
+
+
+@router.post("/in_areas/", response_model=GeoBatchResponseModel,
+    summary="Пакетный геопоиск",
+    description="""
+Проверяет сразу много кругов и областей (правила `/in_circle/` и `/in_frame/`).
+
+Возвращает для каждой области список id предприятий (`results`, в порядке запроса)
+и тела всех найденных предприятий без повторов (`enterprises`).
+Геометрия всегда по правилам EarthRing, независимо от GEO_BACKEND.
+    """)
+def get_enterprises_in_areas(
+    payload: GeoBatchRequestModel,
+    fields: FieldSet = Depends(parse_fields),
     db: Session = Depends(get_db),
     api_key: str = Security(verify_api_key)
+):
+    areas = payload.areas
+
+    if address_index.ready:
+        area_addresses = [
+            address_index.in_circle(area.x, area.y, area.r) if isinstance(area, CircleAreaModel)
+            else address_index.in_frame(area.x1, area.y1, area.x2, area.y2)
+            for area in areas
+        ]
+    else:
+        # Один проход: кандидаты из объединения ячеек всех областей, затем векторные проверки
+        boxes = [
+            box
+            for area in areas
+            for box in (
+                circle_boxes(area.x, area.y, area.r) if isinstance(area, CircleAreaModel)
+                else frame_boxes(area.x1, area.y1, area.x2, area.y2)
+            )
+        ]
+        rows = (
+            db.query(Address.id, Address.longitude, Address.latitude)
+            .filter(cells_clause(boxes, GEO_BATCH_MAX_CELL_RANGES))
+            .all()
+        ) if boxes else []
+
+        earth = EarthRing()
+        address_ids = np.array([address_id for address_id, _, _ in rows], dtype=np.int64)
+        points = earth.to_flat_many([(lon, lat) for _, lon, lat in rows])
+        area_addresses = []
+        for area in areas:
+            if isinstance(area, CircleAreaModel):
+                mask = earth.in_circle_many(a=points, r=area.r, center=earth.to_flat((area.y, area.x)))
+            else:
+                corner1, corner2 = earth.frame_corners(area.x1, area.y1, area.x2, area.y2)
+                mask = earth.in_frame_many(a=corner1, c=points, b=corner2)
+            area_addresses.append(address_ids[mask].tolist())
+
+    all_addresses = set().union(*area_addresses)
+    by_address = {}
+    for enterprise_id, address_id in (
+        db.query(Enterprise.id, Enterprise.address_id)
+        .filter(Enterprise.address_id.in_(all_addresses))
+        .order_by(Enterprise.id)
+    ):
+        by_address.setdefault(address_id, []).append(enterprise_id)
+
+    results = [
+        sorted(enterprise_id for address_id in addresses for enterprise_id in by_address.get(address_id, ()))
+        for addresses in area_addresses
+    ]
+    rows = (
+        enterprise_rows(db.query(Enterprise), fields)
+        .filter(Enterprise.id.in_({enterprise_id for ids in by_address.values() for enterprise_id in ids}))
+        .order_by(Enterprise.id)
+        .all()
+    )
+    encoder = EnterpriseRowEncoder(db, fields)
+    return json_response({"results": results, "enterprises": [encoder.as_dict(row) for row in rows]})
+
+
+@router.get("/clusters/", response_model=List[ClusterResponseModel],
+    summary="Кластеры на карте",
+    description="""
+Группирует предприятия в области (правила как у `/in_frame/`) по ячейкам сетки
+и возвращает для каждой ячейки число предприятий и центр масс.
+
+Размер ячейки зависит от zoom: 1/8 тайла карты, т.е. 360 / 2^zoom / 8 градусов.
+    """)
+def get_enterprise_clusters(
+    x1: float = Query(..., ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y1: float = Query(..., ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    x2: float = Query(..., ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y2: float = Query(..., ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    zoom: int = Query(..., ge=0, le=CLUSTER_MAX_ZOOM),
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
+):
+    earth = EarthRing()
+    size = earth.lon.n / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+    column, row, flat_lon, flat_lat = cluster_columns(size)
+
+    rows = (
+        db.query(func.count(Enterprise.id), func.avg(flat_lon), func.avg(flat_lat))
+        .select_from(Enterprise)
+        .join(Address)
+        .filter(frame_clause(x1, y1, x2, y2))
+        .group_by(row, column)
+        .order_by(row, column)
+        .all()
+    )
+
+    return [
+        ClusterResponseModel(
+            latitude=earth.lat.to_geographical(avg_lat),
+            longitude=earth.lon.to_geographical(avg_lon),
+            count=count,
+        )
+        for count, avg_lon, avg_lat in rows
+    ]
+
+
+@router.get("/nearest/", response_model=List[NearestEnterpriseResponseModel],
+    summary="Ближайшие предприятия",
+    description="""
+Находит k ближайших предприятий к точке (x - широта, y - долгота)
+по расстоянию на большом круге. Расстояние в метрах - в поле `distance`.
+
+Радиус поиска растет, пока не наберется k предприятий.
+Предприятия в одном здании упорядочены по id.
+    """)
+def get_nearest_enterprises(
+    response: Response,
+    x: float = Query(..., ge=-MAX_LATITUDE, le=MAX_LATITUDE),
+    y: float = Query(..., ge=-MAX_LONGITUDE, le=MAX_LONGITUDE),
+    k: int = Query(10, ge=1, le=NEAREST_MAX_K),
+    fields: FieldSet = Depends(parse_fields),
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
     earth = EarthRing()
-    corner1 = earth.to_flat((x1, y1))
-    corner2 = earth.to_flat((x2, y2))
-    all_enterprises = get_enterprises_query(db).all()
+    center = earth.to_flat((y, x))
+    radius = NEAREST_START_RADIUS
+
+    while True:
+        rows = (
+            db.query(Enterprise.id, Enterprise.address_id, Address.longitude, Address.latitude)
+            .join(Address)
+            .filter(cap_clause(x, y, radius))
+            .all()
+        )
+        found = []
+        if rows:
+            points = earth.to_flat_many([(lon, lat) for _, _, lon, lat in rows])
+            distances = earth.distance_many(points, center)
+            found = [
+                (distance, address_id, enterprise_id)
+                for (enterprise_id, address_id, _, _), distance in zip(rows, distances.tolist())
+                if distance <= radius
+            ]
+
+        # Все, что не найдено, дальше radius, а значит дальше любого найденного
+        if len(found) >= k or radius >= math.pi * EARTH_RADIUS:
+            break
+        radius *= 4
+
+    found = sorted(found)[:k]
+    encoder = EnterpriseRowEncoder(db, fields)
+    enterprises = {
+        row.id: encoder.as_dict(row)
+        for row in enterprise_rows(db.query(Enterprise), fields).filter(Enterprise.id.in_([e_id for _, _, e_id in found]))
+    }
 
     result = []
-    for ent in all_enterprises:
-        point = earth.to_flat((ent.address.latitude, ent.address.longitude))
-        if earth.in_frame(a=corner1, c=point, b=corner2):
-            result.append(ent)
-    return result
+    for distance, _, enterprise_id in found:
+        item = enterprises[enterprise_id]
+        item["distance"] = distance
+        result.append(item)
+    return json_response(result, response)
 
 
+@router.post("/in_polygon/", response_model=List[EnterpriseResponseModel],
+    summary="Поиск в многоугольнике",
+    description="""
+Находит все предприятия внутри многоугольника. Вершины - пары (широта, долгота).
+
+Каждое ребро идет по кратчайшей дуге долготы, поэтому многоугольник
+может пересекать 180-й меридиан. Многоугольник вокруг полюса не поддерживается.
+    """)
+def get_enterprises_in_polygon(
+    payload: PolygonModel,
+    response: Response,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
+    db: Session = Depends(get_db),
+    api_key: str = Security(verify_api_key)
+):
+    earth = EarthRing()
+    try:
+        polygon = earth.to_flat_many([(lon, lat) for lat, lon in payload.points])
+        xs, ys = earth.unwrap_polygon(polygon)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # Bounding box в SQL, точная проверка - векторно на кандидатах
+    rows = (
+        db.query(Address.id, Address.longitude, Address.latitude)
+        .filter(cells_clause(polygon_boxes(xs, ys)))
+        .all()
+    )
+
+    address_ids = np.array([address_id for address_id, _, _ in rows], dtype=np.int64)
+    points = earth.to_flat_many([(lon, lat) for _, lon, lat in rows])
+    inside = address_ids[earth.in_polygon_many(polygon, points)].tolist()
+
+    query = db.query(Enterprise).filter(Enterprise.address_id.in_(inside))
+    return page_or_stream(query, page, response, stream, fields)
+
 
 @router.get("/by_domain/{domain_id}", response_model=List[EnterpriseResponseModel],
     summary="Поиск по виду деятельности",
@@ -152,22 +578,28 @@ def get_enterprises_in_frame(
     """)
 def get_enterprises_by_domain(
     domain_id: int,
+    response: Response,
     include_children: bool = True,
+    stream: bool = Query(False, description=STREAM_DESCRIPTION),
+    page: PageParams = Depends(),
+    fields: FieldSet = Depends(parse_fields),
     db: Session = Depends(get_db),
-    api_key: str = Security(verify_api_key)
+    api_key: str = Security(verify_api_key),
+    etag: str = Depends(enterprises_etag)
 ):
-    from server.core.models.domain import Domain
+    from server.core.routers.domain import MAX_DEPTH
 
-    domain = db.query(Domain).filter(Domain.id == domain_id).first()
-    if not domain:
+    tree = domain_tree.get(db)
+    if tree.get(domain_id) is None:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail=f"Domain {domain_id} not found")
 
     if include_children:
-        domain_ids = [domain_id]
-        domain_ids.extend([d.id for d in domain.get_all_descendants()])
-        return get_enterprises_query(db).filter(Enterprise.domain_id.in_(domain_ids)).all()
+        subtree = tree.subtree_ids(domain_id, max_depth=MAX_DEPTH)
+        query = db.query(Enterprise).filter(Enterprise.domain_id.in_(subtree))
+        return page_or_stream(query, page, response, stream, fields)
     else:
-        return get_enterprises_query(db).filter(Enterprise.domain_id == domain_id).all()
+        query = db.query(Enterprise).filter(Enterprise.domain_id == domain_id)
+        return page_or_stream(query, page, response, stream, fields)
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=EnterpriseResponseModel,
     summary="Создать предприятие",
@@ -198,8 +630,13 @@ def create_enterprises(
             for phone_number in payload.phones:
                 db.add(Phone(phone=phone_number, enterprise_id=enterprise.id))
 
+        refresh_search_vectors(db, Enterprise.id == enterprise.id)
+        bump_versions(db, ENTERPRISES_TABLE, ADDRESSES_TABLE)
         db.commit()
-        db.refresh(enterprise)
+        enterprise = get_enterprise(db, enterprise.id)
+        address_index.upsert(address.id, address.latitude, address.longitude)
+        geo_cache.invalidate_point(address.latitude, address.longitude)
+        suggest_index.upsert(ENTERPRISE_KIND, enterprise.id, enterprise.name)
         return enterprise
 
     except IntegrityError as e:
@@ -232,8 +669,11 @@ def replace_enterprises(
             for phone_number in payload.phones:
                 db.add(Phone(phone=phone_number, enterprise_id=enterprise_id))
 
+        refresh_search_vectors(db, Enterprise.id == enterprise_id)
+        bump_versions(db, ENTERPRISES_TABLE)
         db.commit()
-        db.refresh(enterprise)
+        enterprise = get_enterprise(db, enterprise.id)
+        suggest_index.upsert(ENTERPRISE_KIND, enterprise.id, enterprise.name)
         return enterprise
 
     except IntegrityError as e:
@@ -270,8 +710,11 @@ def update_enterprises(
                 for phone_number in phones_data:
                     db.add(Phone(phone=phone_number, enterprise_id=enterprise_id))
 
+        refresh_search_vectors(db, Enterprise.id == enterprise_id)
+        bump_versions(db, ENTERPRISES_TABLE)
         db.commit()
-        db.refresh(enterprise)
+        enterprise = get_enterprise(db, enterprise.id)
+        suggest_index.upsert(ENTERPRISE_KIND, enterprise.id, enterprise.name)
         return enterprise
 
     except IntegrityError as e:
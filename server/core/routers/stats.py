@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Security
+from server.core.schemas.stats import (
+    AddressIndexStatsResponseModel,
+    DomainTreeStatsResponseModel,
+    GeoCacheStatsResponseModel,
+    SuggestIndexStatsResponseModel,
+    TableVersionsStatsResponseModel,
+)
+from server.core.utils.domain_tree import domain_tree
+from server.core.utils.etag import table_versions
+from server.core.utils.geo_cache import geo_cache
+from server.core.utils.spatial_index import address_index
+from server.core.utils.suggest import suggest_index
+from server.core.security import verify_api_key
+
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"],
+)
+
+
+@router.get("/address_index", response_model=AddressIndexStatsResponseModel,
+    summary="Состояние геоиндекса",
+    description="Размер пространственного индекса адресов в памяти и время его построения (в секундах)")
+def get_address_index_stats(
+    api_key: str = Security(verify_api_key)
+):
+    return address_index.stats()
+
+
+@router.get("/domain_tree", response_model=DomainTreeStatsResponseModel,
+    summary="Состояние снимка доменов",
+    description="Версия дерева доменов в памяти, попадания/промахи и число перестроек снимка")
+def get_domain_tree_stats(
+    api_key: str = Security(verify_api_key)
+):
+    return domain_tree.stats()
+
+
+@router.get("/geo_cache", response_model=GeoCacheStatsResponseModel,
+    summary="Состояние кэша геопоиска",
+    description="Число записей кэша результатов /in_circle/ и /in_frame/, доля попаданий, вытеснения по LRU и TTL и точечные сбросы после записей")
+def get_geo_cache_stats(
+    api_key: str = Security(verify_api_key)
+):
+    return geo_cache.stats()
+
+
+@router.get("/suggest_index", response_model=SuggestIndexStatsResponseModel,
+    summary="Состояние индекса автодополнения",
+    description="Число названий и ключей в индексе подсказок и время его построения (в секундах)")
+def get_suggest_index_stats(
+    api_key: str = Security(verify_api_key)
+):
+    return suggest_index.stats()
+
+
+@router.get("/table_versions", response_model=TableVersionsStatsResponseModel,
+    summary="Счетчики изменений таблиц",
+    description="Счетчики таблиц в памяти (по ним строятся ETag), чтения из БД, попадания, число ответов 304 и замеченных записей соседних процессов")
+def get_table_versions_stats(
+    api_key: str = Security(verify_api_key)
+):
+    return table_versions.stats()
@@ -4,6 +4,14 @@ from .enterprise import (
     UpdateEnterpriseModel,
     EnterpriseResponseModel,
     EnterpriseDomainResponseModel,
+    NearestEnterpriseResponseModel,
+    ClusterResponseModel,
+    SuggestResponseModel,
+    CircleAreaModel,
+    FrameAreaModel,
+    GeoBatchRequestModel,
+    GeoBatchResponseModel,
+    PolygonModel,
     PhoneResponseModel,
 )
 
@@ -16,5 +24,13 @@ __all__ = [
     'UpdateEnterpriseModel',
     'EnterpriseResponseModel',
     'EnterpriseDomainResponseModel',
+    'NearestEnterpriseResponseModel',
+    'ClusterResponseModel',
+    'SuggestResponseModel',
+    'CircleAreaModel',
+    'FrameAreaModel',
+    'GeoBatchRequestModel',
+    'GeoBatchResponseModel',
+    'PolygonModel',
     'PhoneResponseModel',
 ]
@@ -51,3 +51,13 @@ class DomainChildResponseModel(DomainBaseResponseModel):
 class DomainResponseModel(DomainBaseResponseModel):
     parent: Optional[DomainParentResponseModel] = None
     children: List[DomainChildResponseModel] = []
+
+
+# Дерево со счетчиками предприятий: в самом домене и во всем поддереве
+class DomainRollupResponseModel(BaseModel):
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    direct_count: int
+    subtree_count: int
+    children: List["DomainRollupResponseModel"] = []
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, ConfigDict, field_validator, model_serializer
-from typing import Optional, List, Any
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_serializer, model_validator
+from typing import Optional, List, Any, Literal, Union, Annotated, Tuple
 from server.core.schemas.address import CreateAddressModel, AddressResponseModel
+from server.core.utils.domain_tree import domain_tree
 
 
 class CreateEnterpriseModel(BaseModel):
@@ -48,6 +49,18 @@ class EnterpriseDomainResponseModel(BaseModel):
     name: str
     full_path: str
 
+    @model_validator(mode='before')
+    @classmethod
+    def resolve_full_path(cls, data: Any) -> Any:
+        # full_path берем из снимка дерева, а не обходом родителей модели
+        if isinstance(data, dict):
+            return data
+
+        node = domain_tree.get().get(data.id)
+        if node is None:
+            return data
+        return {'id': node.id, 'name': node.name, 'full_path': node.full_path}
+
 
 class PhoneResponseModel(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -80,3 +93,60 @@ class EnterpriseResponseModel(BaseModel):
             'phones': phones_list
         }
 
+
+class NearestEnterpriseResponseModel(EnterpriseResponseModel):
+    distance: float = 0.0
+
+    @model_serializer
+    def serialize_model(self):
+        data = super().serialize_model()
+        data['distance'] = self.distance
+        return data
+
+
+class SuggestResponseModel(BaseModel):
+    kind: Literal['enterprise', 'domain']
+    id: int
+    name: str
+
+
+class ClusterResponseModel(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+
+
+# Границы координат как в CreateAddressModel: x - широта, y - долгота
+Latitude = Annotated[float, Field(ge=-90, le=90)]
+Longitude = Annotated[float, Field(ge=-180, le=180)]
+
+
+class CircleAreaModel(BaseModel):
+    type: Literal['circle']
+    x: Latitude
+    y: Longitude
+    r: float
+
+
+class FrameAreaModel(BaseModel):
+    type: Literal['frame']
+    x1: Latitude
+    y1: Longitude
+    x2: Latitude
+    y2: Longitude
+
+
+class GeoBatchRequestModel(BaseModel):
+    areas: List[Annotated[Union[CircleAreaModel, FrameAreaModel], Field(discriminator='type')]] = Field(max_length=1000)
+
+
+class GeoBatchResponseModel(BaseModel):
+    # id предприятий для каждой области, в порядке запроса
+    results: List[List[int]]
+    # Все найденные предприятия без повторов
+    enterprises: List[EnterpriseResponseModel]
+
+
+class PolygonModel(BaseModel):
+    # Вершины (x - широта, y - долгота) по порядку обхода
+    points: List[Tuple[float, float]] = Field(min_length=3, max_length=10000)
@@ -0,0 +1,49 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+
+class AddressIndexStatsResponseModel(BaseModel):
+    ready: bool
+    size: int
+    cells: int
+    build_time: float
+    memory_bytes: int
+
+
+class DomainTreeStatsResponseModel(BaseModel):
+    version: int
+    snapshot_version: Optional[int] = None
+    size: int
+    hits: int
+    misses: int
+    rebuilds: int
+    build_time: float
+
+
+class SuggestIndexStatsResponseModel(BaseModel):
+    ready: bool
+    size: int
+    keys: int
+    build_time: float
+
+
+class TableVersionsStatsResponseModel(BaseModel):
+    versions: Optional[Dict[str, int]] = None
+    ttl: float
+    hits: int
+    reads: int
+    not_modified: int
+    foreign_changes: int
+
+
+class GeoCacheStatsResponseModel(BaseModel):
+    size: int
+    capacity: int
+    ttl: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    invalidations: int
+    oversized: int
@@ -0,0 +1,188 @@
+"""
+Снимок дерева доменов в памяти процесса
+
+Таблица доменов маленькая и почти не меняется, поэтому дерево целиком
+читается одним запросом и хранится как неизменяемый снимок: id -> узел с
+готовыми full_path, depth и списком детей. Роутеры доменов увеличивают
+версию после каждой записи, и следующий читатель строит новый снимок и
+атомарно подменяет старый.
+Версия у каждого процесса своя: запись из соседнего процесса замечает
+кэш счетчиков таблиц (utils/etag.py) и тоже увеличивает версию.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from server.core.db import SessionLocal
+from server.core.models.domain import Domain
+
+
+@dataclass(frozen=True, slots=True)
+class DomainNode:
+    id: int
+    name: str
+    parent_id: Optional[int]
+    full_path: str
+    depth: int
+    children_ids: tuple[int, ...]
+
+    @property
+    def children_count(self) -> int:
+        return len(self.children_ids)
+
+
+class DomainTreeSnapshot:
+    def __init__(self, version: int, nodes: dict[int, DomainNode]):
+        self.version = version
+        self.nodes: Mapping[int, DomainNode] = MappingProxyType(nodes)
+
+    def get(self, domain_id: int) -> Optional[DomainNode]:
+        return self.nodes.get(domain_id)
+
+    def as_dict(self, node: DomainNode) -> dict:
+        """
+        Поля DomainBaseResponseModel
+        """
+        return {
+            "id": node.id,
+            "name": node.name,
+            "parent_id": node.parent_id,
+            "full_path": node.full_path,
+            "children_count": node.children_count,
+        }
+
+    def describe(self, domain_id: int) -> Optional[dict]:
+        """
+        Домен с цепочкой родителей и детьми для DomainResponseModel
+        """
+        node = self.get(domain_id)
+        if node is None:
+            return None
+
+        data = self.as_dict(node)
+        data["children"] = [self.as_dict(self.nodes[child_id]) for child_id in node.children_ids]
+
+        current = data
+        parent = self.get(node.parent_id) if node.parent_id is not None else None
+        while parent is not None:
+            current["parent"] = self.as_dict(parent)
+            current = current["parent"]
+            parent = self.get(parent.parent_id) if parent.parent_id is not None else None
+        return data
+
+    def subtree_ids(self, domain_id: int, max_depth: Optional[int] = None) -> list[int]:
+        """
+        id домена и его потомков; max_depth ограничивает число уровней (сам домен - первый)
+        """
+        result = []
+        level = [domain_id] if domain_id in self.nodes else []
+        depth = 0
+        while level and (max_depth is None or depth < max_depth):
+            result.extend(level)
+            level = [child_id for node_id in level for child_id in self.nodes[node_id].children_ids]
+            depth += 1
+        return result
+
+
+def build_snapshot(db: Session, version: int) -> DomainTreeSnapshot:
+    rows = db.execute(select(Domain.id, Domain.name, Domain.parent_id).order_by(Domain.id)).all()
+    names = {domain_id: name for domain_id, name, _ in rows}
+    parents = {domain_id: parent_id for domain_id, _, parent_id in rows}
+
+    children = {domain_id: [] for domain_id in names}
+    for domain_id, parent_id in parents.items():
+        if parent_id in children:
+            children[parent_id].append(domain_id)
+
+    nodes = {}
+    for domain_id in names:
+        chain = [domain_id]
+        parent_id = parents[domain_id]
+        # Цепочка обрывается на корне, на удаленном родителе или на цикле
+        while parent_id in names and parent_id not in chain:
+            chain.append(parent_id)
+            parent_id = parents[parent_id]
+
+        nodes[domain_id] = DomainNode(
+            id=domain_id,
+            name=names[domain_id],
+            parent_id=parents[domain_id],
+            full_path=" > ".join(names[node_id] for node_id in reversed(chain)),
+            depth=len(chain) - 1,
+            children_ids=tuple(children[domain_id]),
+        )
+
+    return DomainTreeSnapshot(version, nodes)
+
+
+class DomainTreeCache:
+    def __init__(self):
+        self._version = 0
+        self._snapshot: Optional[DomainTreeSnapshot] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.build_time = 0.0
+
+    def bump(self):
+        """
+        Вызывается после каждой записи в таблицу доменов
+        """
+        with self._lock:
+            self._version += 1
+
+    def get(self, db: Session = None) -> DomainTreeSnapshot:
+        """
+        Актуальный снимок; при устаревшей версии перестраивается по db
+        (или по собственной сессии, если db не передана)
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            with self._lock:
+                self.hits += 1
+            return snapshot
+
+        with self._lock:
+            self.misses += 1
+
+        with self._build_lock:
+            # Пока ждали блокировку, снимок мог перестроить другой поток
+            snapshot = self._snapshot
+            version = self._version
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+
+            started = time.perf_counter()
+            if db is None:
+                with SessionLocal() as session:
+                    snapshot = build_snapshot(session, version)
+            else:
+                snapshot = build_snapshot(db, version)
+
+            with self._lock:
+                self._snapshot = snapshot
+                self.rebuilds += 1
+                self.build_time = time.perf_counter() - started
+            return snapshot
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                "version": self._version,
+                "snapshot_version": snapshot.version if snapshot is not None else None,
+                "size": len(snapshot.nodes) if snapshot is not None else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+                "build_time": self.build_time,
+            }
+
+
+domain_tree = DomainTreeCache()
@@ -0,0 +1,244 @@
+"""
+Быстрый путь выдачи списков предприятий: колонки вместо объектов ORM
+
+Список читается одним SELECT нужных колонок предприятия и адреса, телефоны
+собираются в массив в БД (array_agg), домен берется из снимка дерева.
+Строки сразу кодируются в JSON - без загрузки объектов ORM и без
+EnterpriseResponseModel. Байты ответа те же, что у пути через модель:
+страница кодируется stdlib json с настройками JSONResponse, строка NDJSON -
+pydantic_core.to_json, как model_dump_json (форматы float у них разные).
+
+Параметр fields (например fields=id,name,address.latitude) оставляет в
+ответе только перечисленные поля, и в SELECT попадают только их колонки:
+без join адреса, подзапроса телефонов и снимка доменов, если они не нужны.
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional, Sequence
+from fastapi import HTTPException, Query, Response, status
+from pydantic_core import to_json
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import Query as ORMQuery, Session
+from server.core.models.address import Address
+from server.core.models.enterprise import Enterprise, Phone
+from server.core.utils.domain_tree import domain_tree
+from server.core.utils.etag import ETAG_HEADER
+from server.core.utils.pagination import NEXT_CURSOR_HEADER
+
+
+JSON_MEDIA_TYPE = "application/json"
+# Заголовки, которые зависимости ставят во внедренный Response; готовый ответ их не наследует
+CARRIED_HEADERS = (NEXT_CURSOR_HEADER, ETAG_HEADER)
+
+# Поля EnterpriseResponseModel в порядке ключей ответа; у вложенных - их поля
+ENTERPRISE_FIELDS: Mapping[str, tuple[str, ...]] = {
+    "id": (),
+    "name": (),
+    "domain": ("id", "name", "full_path"),
+    "address": ("id", "address", "latitude", "longitude"),
+    "phones": (),
+}
+FIELD_SEPARATOR = ","
+NESTED_SEPARATOR = "."
+FIELDS_DESCRIPTION = (
+    "Поля ответа через запятую, например `id,name,address.latitude`; "
+    "вложенное поле целиком - `address`. По умолчанию все поля"
+)
+
+
+class InvalidFieldsError(HTTPException):
+    """Исключение для неизвестного поля в fields"""
+    def __init__(self, field: str):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field '{field}'"
+        )
+
+
+@dataclass(frozen=True)
+class FieldSet:
+    """
+    Выбранные поля: поле верхнего уровня -> выбранные вложенные поля (в порядке ответа)
+    """
+    fields: Mapping[str, tuple[str, ...]]
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "FieldSet":
+        if spec is None or not spec.strip():
+            return ALL_FIELDS
+
+        selected: dict[str, set[str]] = {}
+        for item in spec.split(FIELD_SEPARATOR):
+            name, _, nested = item.strip().partition(NESTED_SEPARATOR)
+            if name not in ENTERPRISE_FIELDS:
+                raise InvalidFieldsError(item.strip())
+
+            subfields = ENTERPRISE_FIELDS[name]
+            if not nested:
+                selected[name] = set(subfields)
+            elif nested in subfields:
+                selected.setdefault(name, set()).add(nested)
+            else:
+                raise InvalidFieldsError(item.strip())
+
+        return cls({
+            name: tuple(sub for sub in subfields if sub in selected[name])
+            for name, subfields in ENTERPRISE_FIELDS.items()
+            if name in selected
+        })
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.fields
+
+    def nested(self, name: str) -> tuple[str, ...]:
+        return self.fields.get(name, ())
+
+    @property
+    def needs_address_join(self) -> bool:
+        # id адреса есть в самом предприятии (address_id)
+        return any(sub != "id" for sub in self.nested("address"))
+
+
+ALL_FIELDS = FieldSet(dict(ENTERPRISE_FIELDS))
+
+
+def parse_fields(fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)) -> FieldSet:
+    """
+    Зависимость для параметра fields
+    """
+    return FieldSet.parse(fields)
+
+
+def phones_column():
+    """
+    Телефоны предприятия массивом, в порядке id (как у relationship без order_by)
+    """
+    return (
+        select(func.array_agg(aggregate_order_by(Phone.phone, Phone.id)))
+        .where(Phone.enterprise_id == Enterprise.id)
+        .scalar_subquery()
+    )
+
+
+def enterprise_rows(query: ORMQuery, fields: FieldSet = ALL_FIELDS, address_joined: bool = False) -> ORMQuery:
+    """
+    Тот же запрос предприятий, но строками колонок для EnterpriseRowEncoder.
+    Берутся только колонки выбранных полей; адрес присоединяется, если нужны
+    его колонки и запрос еще не присоединил его сам (address_joined).
+    id выбирается всегда - по нему идет курсор пагинации.
+    """
+    columns = [Enterprise.id.label("id")]
+    if "name" in fields:
+        columns.append(Enterprise.name.label("name"))
+    if "domain" in fields:
+        columns.append(Enterprise.domain_id.label("domain_id"))
+
+    address_fields = fields.nested("address")
+    if "id" in address_fields:
+        columns.append(Enterprise.address_id.label("address_id"))
+    if "address" in address_fields:
+        columns.append(Address.address.label("address"))
+    if "latitude" in address_fields:
+        columns.append(Address.latitude.label("latitude"))
+    if "longitude" in address_fields:
+        columns.append(Address.longitude.label("longitude"))
+
+    if "phones" in fields:
+        columns.append(phones_column().label("phones"))
+
+    query = query.with_entities(*columns)
+    if fields.needs_address_join and not address_joined:
+        query = query.join(Enterprise.address)
+    return query
+
+
+def render_json(content: Any) -> bytes:
+    # Настройки starlette JSONResponse.render, которым FastAPI кодирует response_model
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def carried_headers(response: Optional[Response]) -> dict[str, str]:
+    """
+    Курсор следующей страницы и ETag из внедренного response
+    """
+    if response is None:
+        return {}
+    return {name: response.headers[name] for name in CARRIED_HEADERS if name in response.headers}
+
+
+def json_response(content: Any, response: Optional[Response] = None) -> Response:
+    """
+    Готовый JSON ответ с заголовками CARRIED_HEADERS из response
+    """
+    return Response(render_json(content), media_type=JSON_MEDIA_TYPE, headers=carried_headers(response))
+
+
+class EnterpriseRowEncoder:
+    """
+    Строка enterprise_rows -> словарь с выбранными полями EnterpriseResponseModel в ее порядке ключей
+    """
+    def __init__(self, db: Session, fields: FieldSet = ALL_FIELDS):
+        self.db = db
+        self.fields = fields
+        self.domain_fields = fields.nested("domain")
+        self.address_fields = fields.nested("address")
+        # Снимок доменов нужен только для поля domain
+        self.tree = domain_tree.get(db) if "domain" in fields else None
+        self._refreshed = False
+
+    def domain(self, domain_id: Optional[int]) -> Optional[dict]:
+        if domain_id is None:
+            return None
+
+        node = self.tree.get(domain_id)
+        if node is None and not self._refreshed:
+            # Домен записан другим процессом, и снимок этого процесса его еще не видел
+            domain_tree.bump()
+            self.tree = domain_tree.get(self.db)
+            self._refreshed = True
+            node = self.tree.get(domain_id)
+        if node is None:
+            return None
+
+        if self.domain_fields == ENTERPRISE_FIELDS["domain"]:
+            return {"id": node.id, "name": node.name, "full_path": node.full_path}
+        return {name: getattr(node, name) for name in self.domain_fields}
+
+    def address(self, row) -> dict:
+        if self.address_fields == ENTERPRISE_FIELDS["address"]:
+            return {
+                "id": row.address_id,
+                "address": row.address,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+            }
+        return {name: getattr(row, "address_id" if name == "id" else name) for name in self.address_fields}
+
+    def as_dict(self, row) -> dict:
+        if self.fields is ALL_FIELDS:
+            return {
+                "id": row.id,
+                "name": row.name,
+                "domain": self.domain(row.domain_id),
+                "address": self.address(row),
+                "phones": list(row.phones) if row.phones else [],
+            }
+
+        data = {}
+        for name in self.fields.fields:
+            if name == "domain":
+                data[name] = self.domain(row.domain_id)
+            elif name == "address":
+                data[name] = self.address(row)
+            elif name == "phones":
+                data[name] = list(row.phones) if row.phones else []
+            else:
+                data[name] = getattr(row, name)
+        return data
+
+    def ndjson_line(self, row) -> bytes:
+        return to_json(self.as_dict(row))
+
+    def page_response(self, rows: Sequence, response: Response) -> Response:
+        return json_response([self.as_dict(row) for row in rows], response)
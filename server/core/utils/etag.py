@@ -0,0 +1,246 @@
+"""
+Условные GET: ETag по счетчикам изменений таблиц
+
+В таблице table_versions у каждой таблицы свой счетчик. Все записывающие
+обработчики увеличивают счетчики затронутых таблиц в той же транзакции
+(bump_versions), поэтому счетчик меняется ровно тогда, когда видна запись.
+Ответ списка или объекта зависит от нескольких таблиц, и его ETag
+складывается из их счетчиков. Если ETag совпал с If-None-Match, сервер
+отвечает 304 до любого запроса к ORM.
+
+Счетчики читаются одним запросом по первичному ключу и хранятся в памяти
+процесса TABLE_VERSIONS_TTL секунд (0 - читать на каждом запросе).
+После записи в этом процессе кэш сбрасывается сразу, запись соседнего
+процесса видна не позже чем через TTL.
+Счетчики читаются до данных ответа, поэтому тело никогда не старше своего ETag.
+
+Свои записи процесс запоминает по версиям, которые вернул bump_versions.
+Если счетчик вырос на версию, которой нет среди своих, таблицу записал
+соседний процесс: вызываются обработчики on_foreign_change - фоновая
+перестройка геоиндекса и индекса подсказок, сброс кэша геопоиска,
+новая версия снимка дерева доменов.
+"""
+import os
+import threading
+import time
+from typing import Callable, Iterable, Mapping, Optional
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from server.core.db import get_db
+from server.core.models.table_version import TableVersion
+from server.core.utils.domain_tree import domain_tree
+from server.core.utils.geo_cache import geo_cache
+from server.core.utils.rebuild import BackgroundRebuild
+from server.core.utils.spatial_index import address_index
+from server.core.utils.suggest import suggest_index
+
+
+ENTERPRISES_TABLE = "enterprises"
+ADDRESSES_TABLE = "addresses"
+DOMAIN_TABLE = "domain"
+TRACKED_TABLES = (ENTERPRISES_TABLE, ADDRESSES_TABLE, DOMAIN_TABLE)
+
+ETAG_HEADER = "ETag"
+IF_NONE_MATCH_HEADER = "If-None-Match"
+TABLE_VERSIONS_TTL = float(os.getenv("TABLE_VERSIONS_TTL", "1"))
+# Ключ session.info: версии (таблица, версия), выданные bump_versions в текущей транзакции
+BUMPED_VERSIONS_KEY = "bumped_table_versions"
+
+
+class NotModifiedError(HTTPException):
+    """Ответ 304 без тела: у клиента актуальная версия"""
+    def __init__(self, etag: str):
+        super().__init__(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={ETAG_HEADER: etag}
+        )
+
+
+class TableVersionCache:
+    def __init__(self, ttl: float = TABLE_VERSIONS_TTL):
+        self.ttl = ttl
+        self._versions: Optional[dict[str, int]] = None
+        self._fetched_at = 0.0
+        # Увеличивается при каждом сбросе: прочитанное до сброса в кэш не попадает
+        self._generation = 0
+        # Последние сверенные счетчики; None - еще не читались
+        self._seen: Optional[dict[str, int]] = None
+        # Версии, выданные записям этого процесса и еще не сверенные
+        self._local: dict[str, set[int]] = {name: set() for name in TRACKED_TABLES}
+        self._handlers: dict[str, list[Callable[[], None]]] = {name: [] for name in TRACKED_TABLES}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.reads = 0
+        self.not_modified = 0
+        self.foreign_changes = 0
+
+    def on_foreign_change(self, table: str, *handlers: Callable[[], None]):
+        """
+        Обработчики записи в table соседним процессом
+        """
+        self._handlers[table].extend(handlers)
+
+    def invalidate(self, bumped: Iterable[tuple[str, int]] = ()):
+        """
+        Вызывается после фиксации каждой записи в этом процессе;
+        bumped - выданные ей версии таблиц
+        """
+        with self._lock:
+            for name, version in bumped:
+                self._local[name].add(version)
+            self._versions = None
+            self._generation += 1
+
+    def _foreign_tables(self, fetched: Mapping[str, int]) -> list[str]:
+        """
+        Таблицы, чьи счетчики с прошлой сверки выросли не только от своих записей.
+        Первое чтение только запоминает счетчики: индексы строятся после него.
+        """
+        if self._seen is None:
+            self._seen = dict(fetched)
+            return []
+
+        tables = []
+        for name, version in fetched.items():
+            seen = self._seen[name]
+            # Чтение, обогнанное более свежим, ничего не сообщает
+            if version <= seen:
+                continue
+
+            local = self._local[name]
+            own = sum(1 for v in local if seen < v <= version)
+            if own < version - seen:
+                tables.append(name)
+            self._local[name] = {v for v in local if v > version}
+            self._seen[name] = version
+        return tables
+
+    def get(self, db: Session) -> Mapping[str, int]:
+        """
+        Счетчики всех таблиц TRACKED_TABLES; отсутствующие строки считаются нулем
+        """
+        with self._lock:
+            versions = self._versions
+            if versions is not None and time.monotonic() - self._fetched_at < self.ttl:
+                self.hits += 1
+                return versions
+            generation = self._generation
+
+        rows = db.execute(
+            select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(TRACKED_TABLES))
+        ).all()
+        fetched = {name: 0 for name in TRACKED_TABLES}
+        fetched.update(rows)
+
+        with self._lock:
+            self.reads += 1
+            if generation == self._generation:
+                self._versions = fetched
+                self._fetched_at = time.monotonic()
+            foreign = self._foreign_tables(fetched)
+            self.foreign_changes += len(foreign)
+            handlers = [handler for name in foreign for handler in self._handlers[name]]
+
+        for handler in handlers:
+            handler()
+        return fetched
+
+    def etag(self, db: Session, tables: Iterable[str]) -> str:
+        """
+        Сильный ETag ответа, зависящего от таблиц tables
+        """
+        versions = self.get(db)
+        return '"' + "-".join(f"{name[0]}{versions[name]}" for name in tables) + '"'
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "versions": dict(self._versions) if self._versions is not None else None,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "reads": self.reads,
+                "not_modified": self.not_modified,
+                "foreign_changes": self.foreign_changes,
+            }
+
+
+table_versions = TableVersionCache()
+
+address_index_rebuild = BackgroundRebuild("address_index", address_index)
+suggest_index_rebuild = BackgroundRebuild("suggest_index", suggest_index)
+
+# Свои записи роутеры применяют к индексам и кэшам сами, чужие - здесь
+table_versions.on_foreign_change(ADDRESSES_TABLE, address_index_rebuild.request, geo_cache.clear)
+table_versions.on_foreign_change(ENTERPRISES_TABLE, suggest_index_rebuild.request, geo_cache.clear)
+table_versions.on_foreign_change(DOMAIN_TABLE, suggest_index_rebuild.request, domain_tree.bump)
+
+
+def bump_versions(db: Session, *tables: str):
+    """
+    Увеличивает счетчики таблиц в текущей транзакции db; вызывается перед commit.
+    После фиксации сбрасывает счетчики в памяти процесса и запоминает
+    выданные версии как свои.
+    """
+    bumped = db.execute(
+        update(TableVersion)
+        .where(TableVersion.name.in_(tables))
+        .values(version=TableVersion.version + 1)
+        .returning(TableVersion.name, TableVersion.version)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.info.setdefault(BUMPED_VERSIONS_KEY, []).extend(bumped)
+
+    if not event.contains(db, "after_commit", _invalidate_after_commit):
+        event.listen(db, "after_commit", _invalidate_after_commit)
+        event.listen(db, "after_rollback", _forget_after_rollback)
+
+
+def _invalidate_after_commit(session: Session):
+    table_versions.invalidate(session.info.pop(BUMPED_VERSIONS_KEY, ()))
+
+
+def _forget_after_rollback(session: Session):
+    # Откаченные версии получат чужие записи: своими они не считаются
+    session.info.pop(BUMPED_VERSIONS_KEY, None)
+
+
+def matches(if_none_match: str, etag: str) -> bool:
+    """
+    Слабое сравнение для If-None-Match (RFC 9110, 13.1.2): W/ не учитывается
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def conditional_get(*tables: str) -> Callable[..., str]:
+    """
+    Зависимость для GET, чей ответ зависит от tables: 304, если у клиента
+    актуальный ETag, иначе заголовок ETag в ответе. Ставится после проверки
+    API-ключа, чтобы 304 не отдавался без него.
+    """
+    def dependency(request: Request, response: Response, db: Session = Depends(get_db)) -> str:
+        etag = table_versions.etag(db, tables)
+        if_none_match = request.headers.get(IF_NONE_MATCH_HEADER)
+        if if_none_match is not None and matches(if_none_match, etag):
+            table_versions.count_not_modified()
+            raise NotModifiedError(etag)
+
+        response.headers[ETAG_HEADER] = etag
+        return etag
+
+    return dependency
+
+
+enterprises_etag = conditional_get(ENTERPRISES_TABLE, ADDRESSES_TABLE, DOMAIN_TABLE)
+addresses_etag = conditional_get(ADDRESSES_TABLE)
+domains_etag = conditional_get(DOMAIN_TABLE)
@@ -0,0 +1,73 @@
+"""
+Полнотекстовый поиск предприятий
+
+У каждого предприятия хранится документ enterprises.search_vector (tsvector,
+GIN индекс idx_enterprise_search_vector): название, адрес, названия доменов
+на пути от корня и цифры телефонов. Документ пересчитывается одним UPDATE
+по условию - роутеры вызывают refresh_search_vectors в той же транзакции,
+что и запись предприятия, адреса, домена или телефонов.
+"""
+from sqlalchemy import ColumnElement, cast, func, literal, select, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session, aliased
+from ..models.address import Address
+from ..models.domain import Domain
+from ..models.enterprise import Enterprise, Phone
+
+
+# Русская конфигурация: стемминг, "колбасы" находит "колбаса"
+FTS_CONFIG = "russian"
+# Телефоны без морфологии
+PHONE_FTS_CONFIG = "simple"
+
+
+def _part(config: str, text, weight: str):
+    return func.setweight(func.to_tsvector(cast(literal(config), REGCONFIG), func.coalesce(text, "")), weight)
+
+
+def search_document():
+    """
+    Выражение tsvector для строки enterprises: коррелированные подзапросы к адресу,
+    предкам домена (по path) и телефонам. Вес A - название, B - адрес, C - домены, D - телефоны.
+    """
+    own = aliased(Domain)
+    ancestor = aliased(Domain)
+
+    address = select(Address.address).where(Address.id == Enterprise.address_id).scalar_subquery()
+    domains = (
+        select(func.string_agg(ancestor.name, " "))
+        .select_from(own)
+        .join(ancestor, own.path.startswith(ancestor.path))
+        .where(own.id == Enterprise.domain_id)
+        .scalar_subquery()
+    )
+    phones = (
+        select(func.string_agg(func.regexp_replace(Phone.phone, r"\D", "", "g"), " "))
+        .where(Phone.enterprise_id == Enterprise.id)
+        .scalar_subquery()
+    )
+
+    return (
+        _part(FTS_CONFIG, Enterprise.name, "A")
+        .op("||")(_part(FTS_CONFIG, address, "B"))
+        .op("||")(_part(FTS_CONFIG, domains, "C"))
+        .op("||")(_part(PHONE_FTS_CONFIG, phones, "D"))
+    )
+
+
+def refresh_search_vectors(db: Session, *criteria: ColumnElement[bool]):
+    """
+    Пересчитывает документы предприятий, подходящих под условия
+    """
+    db.flush()
+    db.execute(
+        update(Enterprise).where(*criteria).values(search_vector=search_document()),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def search_query(q: str):
+    """
+    Запрос в синтаксисе веб-поиска: слова через пробел, "фраза", -исключение, or
+    """
+    return func.websearch_to_tsquery(cast(literal(FTS_CONFIG), REGCONFIG), q)
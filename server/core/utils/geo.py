@@ -0,0 +1,238 @@
+"""
+SQL-условия для геопоиска
+
+Бэкенд выбирается переменной окружения GEO_BACKEND:
+
+* ring (по умолчанию) - правила EarthRing: форма запроса раскладывается
+  в диапазоны ключей геоячеек (индекс idx_address_cell), затем точная
+  проверка: для области - на плоских координатах колец, для круга -
+  расстояние по большому кругу (haversine). Строки без ячейки (до бэкфилла)
+  проходят только точную проверку.
+* postgres - нативные GiST индексы Postgres: круг через earthdistance
+  (расстояние по большому кругу), область через point <@ box.
+
+Оба бэкенда считают круг на сфере радиуса EARTH_RADIUS, поэтому
+переключение GEO_BACKEND не меняет результатов.
+"""
+import math
+import os
+from sqlalchemy import ColumnElement, and_, or_, func, true
+from server.core.models.address import Address
+from server.core.utils.geocell import MAX_CELL_RANGES, cell_ranges
+from server.core.utils.rings import EARTH_RADIUS, EarthRing, Ring
+
+
+RING_BACKEND = "ring"
+POSTGRES_BACKEND = "postgres"
+GEO_BACKEND = os.getenv("GEO_BACKEND", RING_BACKEND)
+
+earth = EarthRing()
+
+
+def normalise_sql(ring: Ring, value):
+    """
+    SQL-аналог Ring.normalise
+    """
+    if not ring.closed:
+        return value
+
+    return value - ring.n * func.floor(value / ring.n)
+
+
+def to_flat_sql(ring: Ring, column):
+    """
+    SQL-аналог Ring.to_flat
+    """
+    return normalise_sql(ring, column + ring.n // 2)
+
+
+def in_between_sql(ring: Ring, flat, a: float, b: float) -> ColumnElement[bool]:
+    """
+    SQL-аналог Ring.in_between
+    """
+    if a > b and ring.closed:
+        return or_(flat >= a, flat <= b)
+
+    return flat.between(a, b)
+
+
+def ring_segments(ring: Ring, a: float, b: float) -> list[tuple[float, float]]:
+    """
+    Отрезок [a, b] на плоском кольце (как в Ring.in_between) без перехода
+    через точку склейки: такой отрезок делится на два
+    """
+    if a <= b or not ring.closed:
+        return [(max(a, 0), min(b, ring.n))]
+
+    return [(a, ring.n), (0, b)]
+
+
+def to_boxes(lon_segments: list[tuple[float, float]], lat_segment: tuple[float, float]) -> list[tuple[float, float, float, float]]:
+    return [(x0, x1, *lat_segment) for x0, x1 in lon_segments]
+
+
+def cells_clause(boxes: list[tuple[float, float, float, float]], max_ranges: int = MAX_CELL_RANGES) -> ColumnElement[bool]:
+    """
+    Диапазоны геоячеек, покрывающие прямоугольники на плоскости
+    """
+    ranges = cell_ranges(boxes, max_ranges)
+    return or_(Address.cell.is_(None), *[Address.cell.between(lo, hi) for lo, hi in ranges])
+
+
+def lon_segments_around(cx: float, rrad: float) -> list[tuple[float, float]]:
+    if rrad >= earth.lon.n // 2:
+        return [(0, earth.lon.n)]
+
+    return ring_segments(earth.lon, earth.lon.normalise(cx - rrad), earth.lon.normalise(cx + rrad))
+
+
+def cap_boxes(x: float, y: float, d: float) -> list[tuple[float, float, float, float]]:
+    """
+    Прямоугольники на плоскости вокруг сферической шапки радиуса d метров
+    с центром в точке (x - широта, y - долгота)
+    """
+    cx, cy = earth.to_flat((y, x))
+    dlon, dlat = earth.cap_extent(x, d)
+    return to_boxes(lon_segments_around(cx, dlon), ring_segments(earth.lat, cy - dlat, cy + dlat)[0])
+
+
+def circle_boxes(x: float, y: float, r: float) -> list[tuple[float, float, float, float]]:
+    """
+    Прямоугольники на плоскости, покрывающие круг EarthRing.in_circle
+    """
+    return cap_boxes(x, y, r)
+
+
+def frame_boxes(x1: float, y1: float, x2: float, y2: float) -> list[tuple[float, float, float, float]]:
+    """
+    Прямоугольники на плоскости для EarthRing.in_frame: рамка через 180° дает два
+    """
+    (lon1, lat1), (lon2, lat2) = earth.frame_corners(x1, y1, x2, y2)
+    return to_boxes(ring_segments(earth.lon, lon1, lon2), (min(lat1, lat2), max(lat1, lat2)))
+
+
+def circle_clause(x: float, y: float, r: float, backend: str = None) -> ColumnElement[bool]:
+    """
+    Условие "адрес в круге": x - широта, y - долгота центра, r - радиус в метрах
+    """
+    if (backend or GEO_BACKEND) == POSTGRES_BACKEND:
+        return postgres_circle_clause(x, y, r)
+    return ring_circle_clause(x, y, r)
+
+
+def frame_clause(x1: float, y1: float, x2: float, y2: float, backend: str = None) -> ColumnElement[bool]:
+    """
+    Условие "адрес в области": x - широта, y - долгота углов
+    """
+    if (backend or GEO_BACKEND) == POSTGRES_BACKEND:
+        return postgres_frame_clause(x1, y1, x2, y2)
+    return ring_frame_clause(x1, y1, x2, y2)
+
+
+def polygon_boxes(xs, ys) -> list[tuple[float, float, float, float]]:
+    """
+    Прямоугольники на плоскости вокруг многоугольника из EarthRing.unwrap_polygon
+    """
+    west, east = float(min(xs)), float(max(xs))
+    lon_segments = ring_segments(earth.lon, earth.lon.normalise(west), earth.lon.normalise(east))
+    return to_boxes(lon_segments, (float(min(ys)), float(max(ys))))
+
+
+def ring_circle_clause(x: float, y: float, r: float) -> ColumnElement[bool]:
+    """
+    Условие EarthRing.in_circle для адреса: x - широта, y - долгота центра, r - радиус в метрах
+    """
+    # Точная проверка только на строках из коробки шапки
+    return and_(cap_clause(x, y, r), great_circle_sql(x, y, r))
+
+
+def great_circle_sql(x: float, y: float, r: float) -> ColumnElement[bool]:
+    """
+    SQL-аналог EarthRing.distance(...) <= r для адреса: haversine без asin,
+    половина центрального угла сравнивается через sin^2
+    """
+    angle = r / EARTH_RADIUS
+    if angle >= math.pi:
+        return true()
+
+    lat1, lon1 = math.radians(x), math.radians(y)
+    lat2, lon2 = func.radians(Address.latitude), func.radians(Address.longitude)
+    sin_dlat = func.sin((lat2 - lat1) / 2)
+    sin_dlon = func.sin((lon2 - lon1) / 2)
+    h = sin_dlat * sin_dlat + math.cos(lat1) * func.cos(lat2) * sin_dlon * sin_dlon
+    return h <= math.sin(angle / 2) ** 2
+
+
+def ring_frame_clause(x1: float, y1: float, x2: float, y2: float) -> ColumnElement[bool]:
+    """
+    Условие EarthRing.in_frame для адреса: x - широта, y - долгота углов.
+    Рамка через 180° (y1 восточнее y2) дает два прямоугольника.
+    """
+    (lon1, lat1), (lon2, lat2) = earth.frame_corners(x1, y1, x2, y2)
+    lat1, lat2 = min(lat1, lat2), max(lat1, lat2)
+
+    cells = cells_clause(frame_boxes(x1, y1, x2, y2))
+    exact = [
+        in_between_sql(earth.lon, to_flat_sql(earth.lon, Address.longitude), lon1, lon2),
+        in_between_sql(earth.lat, to_flat_sql(earth.lat, Address.latitude), lat1, lat2),
+    ]
+
+    return and_(cells, *exact)
+
+
+def postgres_circle_clause(x: float, y: float, r: float) -> ColumnElement[bool]:
+    """
+    Круг через earthdistance: earth_box идет по GiST индексу idx_address_earth,
+    earth_distance отсекает углы коробки. Сфера earthdistance (earth()) больше
+    EARTH_RADIUS, поэтому радиус масштабируется: угол круга тот же, что у ring.
+    """
+    center = func.ll_to_earth(x, y)
+    location = func.ll_to_earth(Address.latitude, Address.longitude)
+    radius = func.earth() * (r / EARTH_RADIUS)
+    return and_(
+        func.earth_box(center, radius).op("@>")(location),
+        func.earth_distance(center, location) <= radius,
+    )
+
+
+def postgres_frame_clause(x1: float, y1: float, x2: float, y2: float) -> ColumnElement[bool]:
+    """
+    Область через point <@ box по GiST индексу idx_address_point.
+    Долгота - с запада на восток, как в EarthRing.in_frame: рамка через 180° дает две коробки.
+    Как и на кольце, долготы 180 и -180 - один меридиан (у краев рамки и у точек).
+    """
+    location = func.point(Address.longitude, Address.latitude)
+    if y2 - y1 >= earth.lon.n:
+        segments = [(-180, 180)]
+    else:
+        west, east = (-180 if y == 180 else y for y in (y1, y2))
+        segments = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+        if west == -180:
+            segments.append((180, 180))
+    return or_(*[
+        location.op("<@")(func.box(func.point(lon_from, x1), func.point(lon_to, x2)))
+        for lon_from, lon_to in segments
+    ])
+
+
+def cap_clause(x: float, y: float, d: float) -> ColumnElement[bool]:
+    """
+    Bounding box сферической шапки радиуса d метров вокруг точки (x - широта, y - долгота).
+    Точное расстояние по большому кругу проверяется уже на кандидатах.
+    """
+    boxes = cap_boxes(x, y, d)
+    lat_segment = boxes[0][2:]
+    exact = to_flat_sql(earth.lat, Address.latitude).between(*lat_segment)
+
+    return and_(cells_clause(boxes), exact)
+
+
+def cluster_columns(size: float):
+    """
+    Номер ячейки кластера (столбец, строка) и плоские координаты адреса.
+    Границы ячеек совпадают с точкой склейки кольца долгот, поэтому
+    ни одна ячейка не пересекает 180-й меридиан и среднее в ней корректно.
+    """
+    flat_lon = to_flat_sql(earth.lon, Address.longitude)
+    flat_lat = to_flat_sql(earth.lat, Address.latitude)
+    return func.floor(flat_lon / size), func.floor(flat_lat / size), flat_lon, flat_lat
@@ -0,0 +1,227 @@
+"""
+Кэш результатов геопоиска в памяти процесса
+
+Для /in_circle/ и /in_frame/ хранятся предприятия (id и координаты адреса)
+из области-ключа: параметры округлены до GEO_CACHE_PRECISION знаков наружу,
+так что ключ всегда содержит запрошенную область. Рамка расширяется до
+округленных вниз южного и западного и вверх северного и восточного краев;
+центр круга округляется до ближайшего, а радиус увеличивается на наибольший
+сдвиг центра (CENTER_SHIFT) и округляется вверх до GEO_CACHE_RADIUS_STEP метров.
+Соседние окна карты попадают в одну запись, а ответ - только предприятия
+в точной области запроса: фильтр по закэшированным координатам без БД.
+Страница из кэша - один запрос строк по первичному ключу.
+
+Записи вытесняются по LRU (не больше GEO_CACHE_SIZE) и устаревают через
+GEO_CACHE_TTL секунд. После записи адреса или предприятия роутеры сбрасывают
+только те записи, чья область содержит измененные координаты. Как и геоиндекс,
+кэш у каждого процесса свой: запись соседнего процесса сбрасывает его целиком,
+когда ее заметит table_versions (utils/etag.py), и не позже чем через TTL.
+Для областей-ключей больше GEO_CACHE_MAX_IDS предприятий запоминается только
+признак переполнения (с тем же TTL и сбросом): такие запросы сразу идут в БД.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+import numpy as np
+from server.core.utils.rings import EARTH_RADIUS, EarthRing
+
+
+GEO_CACHE_SIZE = int(os.getenv("GEO_CACHE_SIZE", 1024))
+GEO_CACHE_TTL = float(os.getenv("GEO_CACHE_TTL", 60))
+GEO_CACHE_PRECISION = int(os.getenv("GEO_CACHE_PRECISION", 4))
+GEO_CACHE_RADIUS_STEP = float(os.getenv("GEO_CACHE_RADIUS_STEP", 10))
+GEO_CACHE_MAX_IDS = int(os.getenv("GEO_CACHE_MAX_IDS", 10000))
+
+CIRCLE_KIND = "circle"
+FRAME_KIND = "frame"
+# Запас в метрах на границе круга: earthdistance и haversine расходятся в последних знаках
+DISTANCE_MARGIN = 1.0
+# Наибольшее расстояние в метрах между центром круга и его округлением:
+# полшага по широте и долготе, по долготе не больше, чем на экваторе
+CENTER_SHIFT = math.radians(0.5 * 10 ** -GEO_CACHE_PRECISION) * math.sqrt(2) * EARTH_RADIUS + DISTANCE_MARGIN
+
+earth = EarthRing()
+
+
+@dataclass(frozen=True, slots=True)
+class GeoArea:
+    """
+    Область запроса: круг (x, y, r) или рамка (x1, y1, x2, y2); x - широта, y - долгота
+    """
+    kind: str
+    params: tuple[float, ...]
+
+    def contains(self, latitude: float, longitude: float, margin: float = 0.0) -> bool:
+        """
+        Попадает ли точка в область (круг - по большому кругу, как оба GEO_BACKEND);
+        margin расширяет круг на столько метров
+        """
+        point = earth.to_flat((longitude, latitude))
+        if self.kind == CIRCLE_KIND:
+            x, y, r = self.params
+            return earth.distance(point, earth.to_flat((y, x))) <= r + margin
+
+        corner1, corner2 = earth.frame_corners(*self.params)
+        return earth.in_frame(corner1, point, corner2)
+
+    def contains_many(self, points: np.ndarray) -> np.ndarray:
+        """
+        Векторная версия contains для плоских точек (долгота, широта)
+        """
+        if self.kind == CIRCLE_KIND:
+            x, y, r = self.params
+            return earth.in_circle_many(points, r, earth.to_flat((y, x)))
+
+        corner1, corner2 = earth.frame_corners(*self.params)
+        return earth.in_frame_many(corner1, points, corner2)
+
+    def cover(self) -> "GeoArea":
+        """
+        Ключ кэша: область с округленными параметрами, содержащая эту
+        """
+        if self.kind == CIRCLE_KIND:
+            x, y, r = self.params
+            return GeoArea(CIRCLE_KIND, (quantize(x), quantize(y), quantize_radius(r + CENTER_SHIFT)))
+
+        x1, y1, x2, y2 = self.params
+        south, north = quantize_down(min(x1, x2)), quantize_up(max(x1, x2))
+        west, east = quantize_down(y1), quantize_up(y2)
+
+        # Расширенная дуга долгот, дошедшая до всего кольца, - весь мир
+        (lon1, _), (lon2, _) = earth.frame_corners(*self.params)
+        span = lon2 - lon1 if lon2 >= lon1 else lon2 - lon1 + earth.lon.n
+        if span + (y1 - west) + (east - y2) >= earth.lon.n:
+            west, east = -earth.lon.n / 2, earth.lon.n / 2
+        return GeoArea(FRAME_KIND, (south, west, north, east))
+
+
+def quantize(value: float, precision: int = GEO_CACHE_PRECISION) -> float:
+    return round(value, precision)
+
+
+def quantize_down(value: float, precision: int = GEO_CACHE_PRECISION) -> float:
+    scale = 10 ** precision
+    result = math.floor(value * scale) / scale
+    # Деление могло округлить результат выше value
+    return result if result <= value else result - 1 / scale
+
+
+def quantize_up(value: float, precision: int = GEO_CACHE_PRECISION) -> float:
+    scale = 10 ** precision
+    result = math.ceil(value * scale) / scale
+    return result if result >= value else result + 1 / scale
+
+
+def quantize_radius(r: float, step: float = GEO_CACHE_RADIUS_STEP) -> float:
+    # Вверх: округленный круг не теряет точек исходного
+    return math.ceil(r / step) * step
+
+
+class GeoResultCache:
+    def __init__(self, size: int = GEO_CACHE_SIZE, ttl: float = GEO_CACHE_TTL, max_ids: int = GEO_CACHE_MAX_IDS):
+        self.size = size
+        self.ttl = ttl
+        self.max_ids = max_ids
+        # Область-ключ -> (момент устаревания, id предприятий по возрастанию, их плоские точки);
+        # у переполненной области вместо id и точек None
+        self._entries: OrderedDict[GeoArea, tuple[float, Optional[np.ndarray], Optional[np.ndarray]]] = OrderedDict()
+        # Увеличивается при каждом сбросе: результат, посчитанный до сброса, в кэш не попадает
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.oversized = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def ids(self, area: GeoArea, load: Callable[[GeoArea, int], list[tuple[int, float, float]]]) -> Optional[tuple[int, ...]]:
+        """
+        id предприятий в области area по возрастанию. Кэшируются предприятия
+        области-ключа area.cover() из load(cover, limit) - первые limit строк
+        (id, широта, долгота) по возрастанию id; ответ - те из них, что в area.
+        None, если в ключе больше max_ids предприятий: запоминается только это,
+        и до сброса записи load для ключа больше не вызывается.
+        """
+        key = area.cover()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                    self.expirations += 1
+                entry = None
+                self.misses += 1
+                generation = self._generation
+
+        if entry is None:
+            rows = load(key, self.max_ids + 1)
+            if len(rows) > self.max_ids:
+                entry = (time.monotonic() + self.ttl, None, None)
+            else:
+                ids = np.array([enterprise_id for enterprise_id, _, _ in rows], dtype=np.int64)
+                points = earth.to_flat_many([(longitude, latitude) for _, latitude, longitude in rows])
+                entry = (time.monotonic() + self.ttl, ids, points)
+            with self._lock:
+                if entry[1] is None:
+                    self.oversized += 1
+                if generation == self._generation:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.size:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+
+        _, ids, points = entry
+        if ids is None:
+            return None
+        return tuple(ids[area.contains_many(points)].tolist())
+
+    def invalidate_point(self, latitude: float, longitude: float) -> int:
+        """
+        Сбрасывает записи, чья область содержит точку; вызывается после записи адреса или предприятия
+        """
+        with self._lock:
+            self._generation += 1
+            stale = [area for area in self._entries if area.contains(latitude, longitude, DISTANCE_MARGIN)]
+            for area in stale:
+                del self._entries[area]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "oversized": self.oversized,
+            }
+
+
+geo_cache = GeoResultCache()
@@ -0,0 +1,157 @@
+"""
+Ключ геоячейки адреса: Z-order (Morton) код плоских координат EarthRing
+
+Код считается один раз при записи адреса и хранится в индексированной
+колонке addresses.cell. Прямоугольник на плоскости раскладывается в
+небольшой набор диапазонов кодов, и БД отвечает по одному B-tree.
+"""
+import sqlalchemy as sa
+from .rings import EarthRing
+
+
+# Бит на координату: 2^24 делений, ~2.4 м по долготе на экваторе
+CELL_BITS = 24
+CELL_SIDE = 1 << CELL_BITS
+# Сколько диапазонов кодов максимум отдаем в один запрос
+MAX_CELL_RANGES = 32
+BACKFILL_BATCH_SIZE = 1000
+
+earth = EarthRing()
+
+
+def _spread(value: int) -> int:
+    """
+    Раздвигает биты: abc -> 0a0b0c
+    """
+    result = 0
+    for bit in range(CELL_BITS):
+        result |= ((value >> bit) & 1) << (2 * bit)
+    return result
+
+
+def interleave(qx: int, qy: int) -> int:
+    return _spread(qx) | (_spread(qy) << 1)
+
+
+def quantize(value: float, n: int) -> int:
+    """
+    Плоская координата [0, n] -> номер деления [0, CELL_SIDE)
+    """
+    return min(max(int(value / n * CELL_SIDE), 0), CELL_SIDE - 1)
+
+
+def cell_of(latitude: float, longitude: float) -> int:
+    x, y = earth.to_flat((longitude, latitude))
+    return interleave(quantize(x, earth.lon.n), quantize(y, earth.lat.n))
+
+
+def cell_ranges(boxes: list[tuple[float, float, float, float]], max_ranges: int = MAX_CELL_RANGES) -> list[tuple[int, int]]:
+    """
+    Покрывает прямоугольники (x_from, x_to, y_from, y_to) на плоскости
+    диапазонами кодов. Покрытие с запасом: точную проверку делает вызывающий.
+    """
+    rects = [
+        (quantize(x0, earth.lon.n), quantize(x1, earth.lon.n), quantize(y0, earth.lat.n), quantize(y1, earth.lat.n))
+        for x0, x1, y0, y1 in boxes
+    ]
+
+    def relation(level: int, nx: int, ny: int) -> str:
+        shift = CELL_BITS - level
+        x0, x1 = nx << shift, ((nx + 1) << shift) - 1
+        y0, y1 = ny << shift, ((ny + 1) << shift) - 1
+        result = "outside"
+        for rx0, rx1, ry0, ry1 in rects:
+            if x1 < rx0 or x0 > rx1 or y1 < ry0 or y0 > ry1:
+                continue
+            if rx0 <= x0 and x1 <= rx1 and ry0 <= y0 and y1 <= ry1:
+                return "inside"
+            result = "partial"
+        return result
+
+    def code_range(level: int, nx: int, ny: int) -> tuple[int, int]:
+        size = 1 << (2 * (CELL_BITS - level))
+        lo = interleave(nx, ny) * size
+        return lo, lo + size - 1
+
+    # Дробим квадродерево по уровням, пока укладываемся в бюджет диапазонов
+    full = []
+    partial = [(0, 0)]
+    level = 0
+    while partial and level < CELL_BITS:
+        children = [
+            (2 * nx + dx, 2 * ny + dy)
+            for nx, ny in partial
+            for dy in (0, 1)
+            for dx in (0, 1)
+        ]
+        inside, still_partial = [], []
+        for nx, ny in children:
+            kind = relation(level + 1, nx, ny)
+            if kind == "inside":
+                inside.append((nx, ny))
+            elif kind == "partial":
+                still_partial.append((nx, ny))
+
+        if len(full) + len(inside) + len(still_partial) > max_ranges:
+            break
+
+        level += 1
+        full.extend(code_range(level, nx, ny) for nx, ny in inside)
+        partial = still_partial
+
+    full.extend(code_range(level, nx, ny) for nx, ny in partial)
+
+    merged = []
+    for lo, hi in sorted(full):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def backfill_cells(connection: sa.Connection, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Заполняет addresses.cell для старых строк пачками по id.
+
+    Соединение должно быть в режиме AUTOCOMMIT: каждая пачка фиксируется
+    отдельно и держит блокировки только своих строк.
+    """
+    addresses = sa.table(
+        "addresses",
+        sa.column("id", sa.BigInteger),
+        sa.column("latitude", sa.Float),
+        sa.column("longitude", sa.Float),
+        sa.column("cell", sa.BigInteger),
+    )
+    update = (
+        sa.update(addresses)
+        .where(addresses.c.id == sa.bindparam("_id"))
+        .values(cell=sa.bindparam("_cell"))
+    )
+
+    last_id = 0
+    total = 0
+    while True:
+        rows = connection.execute(
+            sa.select(addresses.c.id, addresses.c.latitude, addresses.c.longitude)
+            .where(addresses.c.cell.is_(None), addresses.c.id > last_id)
+            .order_by(addresses.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return total
+
+        connection.execute(update, [
+            {"_id": address_id, "_cell": cell_of(latitude, longitude)}
+            for address_id, latitude, longitude in rows
+        ])
+        last_id = rows[-1][0]
+        total += len(rows)
+
+
+if __name__ == "__main__":
+    from server.core.db import engine
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        print(f"[OK] Заполнено ячеек: {backfill_cells(connection)}")
@@ -0,0 +1,55 @@
+"""
+Стратегии загрузки связей моделей
+
+Все роутеры берут опции загрузки отсюда, чтобы число запросов на эндпоинт
+не зависело от числа строк:
+
+* скалярные связи (адрес, домен предприятия) - joinedload, в том же SELECT;
+* коллекции (телефоны) - отдельным запросом на всю выборку, без
+  декартова произведения строк. Стратегия задается переменной окружения
+  COLLECTION_LOADER:
+  selectin (по умолчанию) - WHERE ... IN (id выборки), пачками по 500;
+  subquery - один запрос с исходным SELECT в подзапросе.
+"""
+import os
+from sqlalchemy.orm import contains_eager, joinedload, selectinload, subqueryload
+from server.core.models.enterprise import Enterprise
+
+
+SELECTIN_LOADER = "selectin"
+SUBQUERY_LOADER = "subquery"
+COLLECTION_LOADER = os.getenv("COLLECTION_LOADER", SELECTIN_LOADER)
+
+_COLLECTION_LOADERS = {
+    SELECTIN_LOADER: selectinload,
+    SUBQUERY_LOADER: subqueryload,
+}
+
+if COLLECTION_LOADER not in _COLLECTION_LOADERS:
+    raise ValueError(f"COLLECTION_LOADER must be one of {', '.join(_COLLECTION_LOADERS)}, got {COLLECTION_LOADER!r}")
+
+
+def collection(attr, strategy: str = COLLECTION_LOADER):
+    """
+    Опция загрузки коллекции отдельным запросом
+    """
+    return _COLLECTION_LOADERS[strategy](attr)
+
+
+def scalar(attr):
+    """
+    Опция загрузки связи "многие к одному" в том же SELECT
+    """
+    return joinedload(attr)
+
+
+def enterprise_options(address_joined: bool = False) -> list:
+    """
+    Предприятие с адресом, доменом и телефонами (EnterpriseResponseModel).
+    address_joined - адрес уже присоединен к запросу через join, берется из его колонок.
+    """
+    return [
+        contains_eager(Enterprise.address) if address_joined else scalar(Enterprise.address),
+        scalar(Enterprise.domain),
+        collection(Enterprise.phones),
+    ]
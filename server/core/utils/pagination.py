@@ -0,0 +1,146 @@
+"""
+Keyset-пагинация списков
+
+Страница задается параметрами limit и cursor. Курсор - непрозрачная строка
+с ключами сортировки последней строки страницы; следующая страница читается
+условием "ключ больше курсора", без OFFSET, поэтому глубокая прокрутка
+стоит столько же, сколько первая страница. Курсор следующей страницы
+возвращается в заголовке X-Next-Cursor (нет заголовка - страниц больше нет).
+"""
+import base64
+import binascii
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query as ORMQuery
+
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", 100))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", 1000))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(HTTPException):
+    """Исключение для испорченного или чужого курсора"""
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+        cursor: Optional[str] = Query(None, description=f"Курсор из заголовка {NEXT_CURSOR_HEADER} предыдущей страницы"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """
+    Ключ сортировки: колонка для SQL и способ достать значение из строки результата.
+    Вычисляемый ключ (computed, например ранг поиска) добавляется в SELECT,
+    и значение для курсора берется из ответа БД.
+    Последним ключом всегда должен быть уникальный id.
+    """
+    column: Any
+    descending: bool = False
+    value: Optional[Callable[[Any], Any]] = None
+    computed: bool = False
+
+    def of(self, item) -> Any:
+        if self.value is not None:
+            return self.value(item)
+        return getattr(item, self.column.key)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise InvalidCursorError()
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError()
+    if not all(isinstance(value, (int, float, str)) for value in values):
+        raise InvalidCursorError()
+    return values
+
+
+def after_clause(keys: Sequence[SortKey], values: Sequence[Any]):
+    """
+    Условие "строка после курсора" для составного ключа:
+    k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+    """
+    branches = []
+    for i, key in enumerate(keys):
+        step = key.column < values[i] if key.descending else key.column > values[i]
+        branches.append(and_(*[keys[j].column == values[j] for j in range(i)], step))
+    return or_(*branches)
+
+
+def paginate(query: ORMQuery, page: PageParams, response: Response, *keys: SortKey) -> list:
+    """
+    Одна страница запроса по ключам keys; курсор следующей кладется в заголовок ответа
+    """
+    if page.cursor is not None:
+        query = query.filter(after_clause(keys, decode_cursor(page.cursor, len(keys))))
+
+    # Запрос одной ORM-сущности отдает объекты, запрос колонок - строки Row,
+    # даже если колонка одна (fields=id)
+    single_entity = selects_entity(query)
+    computed = [key for key in keys if key.computed]
+    if computed:
+        query = query.add_columns(*[key.column for key in computed])
+
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = query.order_by(*order_clauses(keys)).limit(page.limit + 1).all()
+    # У строк колонок добавленные значения остаются в хвосте строки
+    items = [row[0] for row in rows] if computed and single_entity else rows
+
+    if len(items) > page.limit:
+        last = rows[page.limit - 1]
+        computed_values = iter(last[len(last) - len(computed):]) if computed else iter(())
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([
+            next(computed_values) if key.computed else key.of(items[page.limit - 1]) for key in keys
+        ])
+        items = items[:page.limit]
+    return items
+
+
+def selects_entity(query: ORMQuery) -> bool:
+    """
+    Выбирает ли запрос ровно одну ORM-сущность (не колонку)
+    """
+    descriptions = query.column_descriptions
+    return len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["entity"]
+
+
+def order_clauses(keys: Sequence[SortKey]) -> list:
+    return [key.column.desc() if key.descending else key.column.asc() for key in keys]
+
+
+def paginate_items(items: Sequence[Any], page: PageParams, response: Response, key: Callable[[Any], int]) -> list:
+    """
+    То же для уже загруженного списка, отсортированного по возрастанию key (id)
+    """
+    if page.cursor is not None:
+        after = decode_cursor(page.cursor, 1)[0]
+        items = [item for item in items if key(item) > after]
+
+    result = list(items[:page.limit])
+    if len(items) > page.limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([key(result[-1])])
+    return result
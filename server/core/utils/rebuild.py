@@ -0,0 +1,65 @@
+"""
+Фоновая перестройка индексов процесса
+
+Индексы в памяти (геоиндекс, подсказки) обновляются роутерами только на
+записях своего процесса. Запись соседнего процесса замечает table_versions
+(utils/etag.py) и вызывает request(): индекс перестраивается в отдельном
+потоке по собственной сессии, запросы тем временем читают старый снимок.
+Запросы во время перестройки склеиваются в одну следующую перестройку.
+"""
+import threading
+from typing import Callable, Protocol
+from sqlalchemy.orm import Session
+from server.core.db import SessionLocal
+
+
+class RebuildableIndex(Protocol):
+    ready: bool
+
+    def build(self, db: Session): ...
+
+
+class BackgroundRebuild:
+    def __init__(self, name: str, index: RebuildableIndex, session_factory: Callable[[], Session] = SessionLocal):
+        self.name = name
+        self.index = index
+        self.session_factory = session_factory
+        self._running = False
+        self._pending = False
+        self._lock = threading.Lock()
+
+        self.rebuilds = 0
+        self.failures = 0
+
+    def request(self):
+        """
+        Запланировать перестройку; индекс, который еще не строился, не трогается
+        """
+        if not self.index.ready:
+            return
+
+        with self._lock:
+            if self._running:
+                self._pending = True
+                return
+            self._running = True
+
+        threading.Thread(target=self._run, name=f"rebuild-{self.name}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.session_factory() as db:
+                    self.index.build(db)
+                with self._lock:
+                    self.rebuilds += 1
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                print(f"[ERR] Ошибка фоновой перестройки {self.name}: {e}")
+
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    return
+                self._pending = False
@@ -1,14 +1,26 @@
 from locale import normalize
 import math
+import numpy as np
+
+
+# Средний радиус Земли в метрах
+EARTH_RADIUS = 6371000
+# Сколько пар (ребро, точка) проверять за один шаг numpy в in_polygon_many
+POLYGON_CHUNK = 1_000_000
+POLYGON_EDGES_PER_BAND = 8
+POLYGON_MAX_BANDS = 1024
 
 
 class Ring:
-    def __init__(self, n: int):
+    def __init__(self, n: int, closed: bool = True):
         """
             Тут использую кольцо так как координаты это в целом два кольца
             R/Rn
+
+            closed=False - отрезок вместо кольца (широта: полюса не склеиваются)
         """
         self.n = n
+        self.closed = closed
 
     def to_geographical(self, value: float):
         """
@@ -33,6 +45,9 @@ class Ring:
         Нормализует значение на кольце
         value % n
         """
+        if not self.closed:
+            return value
+
         if value < 0:
             value = abs(value) % self.n
             return (self.n - value) % self.n
@@ -79,17 +94,88 @@ class Ring:
 
         return a <= c <= b
 
+    def distance(self, a, b):
+        """
+            Кратчайшее расстояние между a и b по кольцу
+        """
+        if not self.closed:
+            return abs(a - b)
+
+        d = self.sub(a, b)
+        return min(d, self.n - d)
+
+    # Векторные версии: c/value - массивы numpy, результат совпадает со скалярными поэлементно
+
+    def normalise_many(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        if not self.closed:
+            return values
+
+        return np.where(values < 0, (self.n - np.abs(values) % self.n) % self.n, values % self.n)
+
+    def to_flat_many(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        if np.any(np.abs(values) > self.n // 2):
+            raise ValueError("Value is out of range")
+
+        return self.normalise_many(values + self.n // 2)
+
+    def in_between_many(self, a, c: np.ndarray, b) -> np.ndarray:
+        c = np.asarray(c, dtype=float)
+        if a > b:
+            b = self.sub(b, a)
+            c = self.normalise_many(c - a)
+            a = 0
+
+        return (a <= c) & (c <= b)
+
+    def distance_many(self, a: np.ndarray, b) -> np.ndarray:
+        a = np.asarray(a, dtype=float)
+        if not self.closed:
+            return np.abs(a - b)
+
+        d = self.normalise_many(a - b)
+        return np.minimum(d, self.n - d)
+
+    def unwrap_many(self, values: np.ndarray) -> np.ndarray:
+        """
+        Разворачивает последовательность значений на кольце в непрерывную:
+        каждый шаг - кратчайшая дуга со знаком
+        """
+        values = np.asarray(values, dtype=float)
+        if not self.closed or len(values) == 0:
+            return values
+
+        steps = self.normalise_many(np.diff(values))
+        steps = np.where(steps > self.n / 2, steps - self.n, steps)
+        return np.concatenate(([values[0]], values[0] + np.cumsum(steps)))
+
 class EarthRing:
     def __init__(self):
-        self.lat = Ring(180)
+        self.lat = Ring(180, closed=False)
         self.lon = Ring(360)
 
+    def frame_corners(self, x1: float, y1: float, x2: float, y2: float) -> tuple[tuple[float, float], tuple[float, float]]:
+        """
+        Углы рамки (x - широта, y - долгота) на плоскости для in_frame.
+        Рамка от -180 до 180 - все кольцо долгот: восточный край 360,
+        иначе он склеился бы с западным в 0 и рамка сжалась бы до 180-го меридиана.
+        """
+        corner1 = self.to_flat((y1, x1))
+        corner2 = self.to_flat((y2, x2))
+        if y2 - y1 >= self.lon.n:
+            corner2 = (self.lon.n, corner2[1])
+        return corner1, corner2
+
     def in_frame(self, a, c, b):
+        """
+        Долгота идет с запада на восток от a к b: если a восточнее b,
+        рамка пересекает 180-й меридиан. Широта сортируется.
+        """
         x1,y1 = a
         x2,y2 = b
         x3,y3 = c
 
-        x1, x2 = min(x1, x2), max(x1, x2)
         y1, y2 = min(y1, y2), max(y1, y2)
 
         # print(x1, x3, x2)
@@ -100,11 +186,124 @@ class EarthRing:
         return self.lon.in_between(x1, x3, x2) and self.lat.in_between(y1, y3, y2)
 
     def in_circle(self, a, r, center):
-        x, y = a
-        cx, cy = center
-        R = 6371000
-        rrad = r / R * 180 / math.pi
-        return (x - cx) ** 2 + (y - cy) ** 2 <= rrad ** 2
+        """
+        Точка a не дальше r метров от center по большому кругу
+        """
+        return self.distance(a, center) <= r
+
+    def cap_extent(self, latitude: float, r: float) -> tuple[float, float]:
+        """
+        Полуширина по долготе и полувысота по широте в градусах у сферической
+        шапки радиуса r метров с центром на широте latitude.
+        Шапка с полюсом занимает все кольцо долгот.
+        """
+        angle = r / EARTH_RADIUS
+        dlat = math.degrees(angle)
+        dlon = self.lon.n / 2
+        if angle < math.pi / 2 and -90 < latitude - dlat and latitude + dlat < 90:
+            dlon = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(latitude)))))
+        return dlon, dlat
+
+    def to_degrees(self, r: float):
+        """
+        Переводит расстояние в метрах в градусы дуги
+        """
+        return r / EARTH_RADIUS * 180 / math.pi
+
+    def distance(self, a, b):
+        """
+        Расстояние по большому кругу в метрах между плоскими точками a и b
+        """
+        lon1, lat1 = map(math.radians, self.to_geographical(a))
+        lon2, lat2 = map(math.radians, self.to_geographical(b))
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(h)))
+
+    # Векторные версии: points - массив (N, 2) в порядке (долгота, широта)
+
+    def distance_many(self, a: np.ndarray, b) -> np.ndarray:
+        a = np.radians(np.asarray(a, dtype=float) - (self.lon.n // 2, self.lat.n // 2))
+        lon2, lat2 = map(math.radians, self.to_geographical(b))
+        lon1, lat1 = a[:, 0], a[:, 1]
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * math.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+
+    def in_frame_many(self, a, c: np.ndarray, b) -> np.ndarray:
+        x1,y1 = a
+        x2,y2 = b
+        c = np.asarray(c, dtype=float)
+
+        y1, y2 = min(y1, y2), max(y1, y2)
+
+        return self.lon.in_between_many(x1, c[:, 0], x2) & self.lat.in_between_many(y1, c[:, 1], y2)
+
+    def in_circle_many(self, a: np.ndarray, r, center) -> np.ndarray:
+        return self.distance_many(a, center) <= r
+
+    def unwrap_polygon(self, polygon: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Вершины многоугольника на плоскости -> непрерывные долготы и широты.
+        Многоугольник через 180-й меридиан становится обычным,
+        многоугольник вокруг полюса не поддерживается.
+        """
+        polygon = np.asarray(polygon, dtype=float).reshape(-1, 2)
+        closed = self.lon.unwrap_many(np.append(polygon[:, 0], polygon[0, 0]))
+        if abs(closed[-1] - closed[0]) > self.lon.n / 2:
+            raise ValueError("Polygon must not wrap around a pole")
+
+        return closed[:-1], polygon[:, 1]
+
+    def in_polygon_many(self, polygon: np.ndarray, c: np.ndarray) -> np.ndarray:
+        """
+        Точки c внутри многоугольника polygon (правило чет-нечет)
+        """
+        xs, ys = self.unwrap_polygon(polygon)
+        c = np.asarray(c, dtype=float).reshape(-1, 2)
+
+        # Точки переносим на тот же виток кольца, что и многоугольник
+        west = xs.min()
+        px = west + self.lon.normalise_many(c[:, 0] - west)
+        py = c[:, 1]
+
+        x1, y1 = xs, ys
+        x2, y2 = np.roll(xs, -1), np.roll(ys, -1)
+
+        # Горизонтальные полосы: точка проверяется только с ребрами своей полосы
+        south, north = ys.min(), ys.max()
+        bands = int(min(max(len(xs) // POLYGON_EDGES_PER_BAND, 1), POLYGON_MAX_BANDS))
+        height = (north - south) / bands or 1.0
+
+        inside = np.zeros(len(c), dtype=bool)
+        candidates = np.nonzero((south <= py) & (py <= north))[0]
+        point_band = np.minimum(((py[candidates] - south) // height).astype(int), bands - 1)
+        order = np.argsort(point_band, kind="stable")
+        candidates, point_band = candidates[order], point_band[order]
+        bounds = np.searchsorted(point_band, np.arange(bands + 1))
+
+        edge_from = np.minimum(((np.minimum(y1, y2) - south) // height).astype(int), bands - 1)
+        edge_to = np.minimum(((np.maximum(y1, y2) - south) // height).astype(int), bands - 1)
+
+        for band in range(bands):
+            points = candidates[bounds[band]:bounds[band + 1]]
+            if not len(points):
+                continue
+            edges = np.nonzero((edge_from <= band) & (band <= edge_to))[0]
+            bx, by = px[points], py[points]
+
+            chunk = max(1, POLYGON_CHUNK // len(points))
+            for start in range(0, len(edges), chunk):
+                e = edges[start:start + chunk]
+                ex1, ey1 = x1[e, None], y1[e, None]
+                ex2, ey2 = x2[e, None], y2[e, None]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    crossing = (ey1 > by) != (ey2 > by)
+                    crossing &= bx < (ex2 - ex1) * (by - ey1) / (ey2 - ey1) + ex1
+                inside[points] ^= np.logical_xor.reduce(crossing, axis=0)
+        return inside
+
+    def to_flat_many(self, points: np.ndarray) -> np.ndarray:
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return np.column_stack((self.lon.to_flat_many(points[:, 0]), self.lat.to_flat_many(points[:, 1])))
 
     def to_flat(self, point: tuple[float, float]):
         return self.lon.to_flat(point[0]), self.lat.to_flat(point[1])
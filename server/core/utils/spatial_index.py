@@ -0,0 +1,183 @@
+"""
+Пространственный индекс адресов в памяти процесса
+
+Равномерная сетка на плоских координатах EarthRing: ячейка -> id адресов.
+Строится при старте приложения и обновляется роутерами после каждой записи
+адреса, поэтому in_circle/in_frame не ходят в БД за фильтрацией.
+Индекс у каждого процесса свой: запись адреса в соседнем процессе замечает
+table_versions (utils/etag.py) по счетчику addresses и запускает фоновую
+перестройку. Записи этого процесса во время перестройки не теряются:
+они повторяются поверх нового снимка.
+"""
+import math
+import sys
+import threading
+import time
+from typing import Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from server.core.models.address import Address
+from server.core.utils.rings import EarthRing
+
+
+# Размер ячейки сетки в градусах
+GRID_CELL_DEGREES = 0.25
+
+
+class SpatialIndex:
+    def __init__(self, cell_size: float = GRID_CELL_DEGREES):
+        self.earth = EarthRing()
+        self.cell_size = cell_size
+        self.columns = math.ceil(self.earth.lon.n / cell_size)
+        self.rows = math.ceil(self.earth.lat.n / cell_size) + 1
+
+        self._points: dict[int, tuple[float, float]] = {}
+        self._cells: dict[tuple[int, int], set[int]] = {}
+        # Изменения (id, точка или None), сделанные во время build
+        self._journal: Optional[list[tuple[int, Optional[tuple[float, float]]]]] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+        self.ready = False
+        self.build_time = 0.0
+
+    def _cell(self, point: tuple[float, float]) -> tuple[int, int]:
+        x, y = point
+        return int(x // self.cell_size) % self.columns, int(y // self.cell_size)
+
+    def _columns_between(self, a: float, b: float) -> list[int]:
+        """
+        Столбцы сетки для отрезка долгот [a, b] по правилам Ring.in_between
+        """
+        first, last = int(a // self.cell_size), min(int(b // self.cell_size), self.columns - 1)
+        if a <= b:
+            return list(range(first, last + 1))
+        return list(range(first, self.columns)) + list(range(0, last + 1))
+
+    def _rows_between(self, a: float, b: float) -> range:
+        return range(max(int(a // self.cell_size), 0), min(int(b // self.cell_size), self.rows - 1) + 1)
+
+    def _candidates(self, columns: list[int], rows: range) -> tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            # Если ячеек в области больше, чем занятых, дешевле пройти по занятым
+            if len(columns) * len(rows) > len(self._cells):
+                columns_set = set(columns)
+                cells = [
+                    ids for (col, row), ids in self._cells.items()
+                    if col in columns_set and row in rows
+                ]
+            else:
+                cells = [self._cells.get((col, row), ()) for col in columns for row in rows]
+
+            address_ids = [address_id for ids in cells for address_id in ids]
+            points = [self._points[address_id] for address_id in address_ids]
+
+        return np.array(address_ids, dtype=np.int64), np.array(points, dtype=float).reshape(-1, 2)
+
+    def build(self, db: Session):
+        """
+        Полная перестройка индекса по таблице адресов
+        """
+        with self._build_lock:
+            started = time.perf_counter()
+            points = {}
+            cells = {}
+
+            with self._lock:
+                self._journal = []
+            try:
+                rows = db.query(Address.id, Address.latitude, Address.longitude).yield_per(10000)
+                for address_id, latitude, longitude in rows:
+                    point = self.earth.to_flat((longitude, latitude))
+                    points[address_id] = point
+                    cells.setdefault(self._cell(point), set()).add(address_id)
+            finally:
+                with self._lock:
+                    journal, self._journal = self._journal, None
+
+            with self._lock:
+                self._points = points
+                self._cells = cells
+                # Чтение таблицы могло не увидеть записей, сделанных за это время
+                for address_id, point in journal:
+                    self._apply(address_id, point)
+                self.ready = True
+                self.build_time = time.perf_counter() - started
+
+    def upsert(self, address_id: int, latitude: float, longitude: float):
+        point = self.earth.to_flat((longitude, latitude))
+        with self._lock:
+            self._apply(address_id, point)
+
+    def remove(self, address_id: int):
+        with self._lock:
+            self._apply(address_id, None)
+
+    def _apply(self, address_id: int, point: Optional[tuple[float, float]]):
+        if self._journal is not None:
+            self._journal.append((address_id, point))
+
+        self._discard(address_id)
+        if point is not None:
+            self._points[address_id] = point
+            self._cells.setdefault(self._cell(point), set()).add(address_id)
+
+    def _discard(self, address_id: int):
+        point = self._points.pop(address_id, None)
+        if point is None:
+            return
+
+        cell = self._cell(point)
+        ids = self._cells[cell]
+        ids.discard(address_id)
+        if not ids:
+            del self._cells[cell]
+
+    def in_circle(self, x: float, y: float, r: float) -> list[int]:
+        """
+        id адресов в круге: x - широта, y - долгота центра, r - радиус в метрах
+        """
+        center = self.earth.to_flat((y, x))
+        cx, cy = center
+        dlon, dlat = self.earth.cap_extent(x, r)
+
+        if dlon < self.earth.lon.n // 2:
+            columns = self._columns_between(
+                self.earth.lon.normalise(cx - dlon),
+                self.earth.lon.normalise(cx + dlon),
+            )
+        else:
+            columns = list(range(self.columns))
+        rows = self._rows_between(cy - dlat, cy + dlat)
+
+        address_ids, points = self._candidates(columns, rows)
+        return address_ids[self.earth.in_circle_many(a=points, r=r, center=center)].tolist()
+
+    def in_frame(self, x1: float, y1: float, x2: float, y2: float) -> list[int]:
+        """
+        id адресов в области: x - широта, y - долгота углов
+        """
+        corner1, corner2 = self.earth.frame_corners(x1, y1, x2, y2)
+
+        columns = self._columns_between(corner1[0], corner2[0])
+        rows = self._rows_between(min(corner1[1], corner2[1]), max(corner1[1], corner2[1]))
+
+        address_ids, points = self._candidates(columns, rows)
+        return address_ids[self.earth.in_frame_many(a=corner1, c=points, b=corner2)].tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            memory = sys.getsizeof(self._points) + sys.getsizeof(self._cells)
+            memory += sum(sys.getsizeof(point) for point in self._points.values())
+            memory += sum(sys.getsizeof(ids) for ids in self._cells.values())
+
+            return {
+                "ready": self.ready,
+                "size": len(self._points),
+                "cells": len(self._cells),
+                "build_time": self.build_time,
+                "memory_bytes": memory,
+            }
+
+
+address_index = SpatialIndex()
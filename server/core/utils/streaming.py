@@ -0,0 +1,48 @@
+"""
+Потоковая выдача больших списков в NDJSON
+
+Строки читаются пачками через серверный курсор (yield_per) и каждая пачка
+сразу уходит в сокет, поэтому память не растет с числом строк.
+Зависимость get_db закрывает сессию до отправки тела ответа, так что
+поток открывает собственную сессию и исполняет в ней готовый запрос.
+"""
+from typing import Any, Callable, Iterator, Mapping, Optional
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+from server.core.db import SessionLocal
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 1000
+
+# По сессии потока возвращает функцию: строка результата -> JSON без перевода строки
+RowEncoder = Callable[[Session], Callable[[Any], bytes]]
+
+
+def iter_ndjson(query: Query, encoder: RowEncoder, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[bytes]:
+    with SessionLocal() as db:
+        # 2.0-стиль исполнения: legacy Query с joinedload включает unique(), несовместимый с yield_per
+        rows = db.execute(query.statement, execution_options={"yield_per": batch_size})
+        encode = encoder(db)
+
+        batch = []
+        for row in rows:
+            batch.append(encode(row))
+            if len(batch) >= batch_size:
+                yield b"\n".join(batch) + b"\n"
+                batch = []
+
+        if batch:
+            yield b"\n".join(batch) + b"\n"
+
+
+def stream_ndjson(
+    query: Query,
+    encoder: RowEncoder,
+    batch_size: int = STREAM_BATCH_SIZE,
+    headers: Optional[Mapping[str, str]] = None,
+) -> StreamingResponse:
+    """
+    Ответ NDJSON: по одному объекту на строку результата query
+    """
+    return StreamingResponse(iter_ndjson(query, encoder, batch_size), media_type=NDJSON_MEDIA_TYPE, headers=headers)
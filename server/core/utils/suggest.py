@@ -0,0 +1,143 @@
+"""
+Индекс автодополнения по названиям предприятий и доменов в памяти процесса
+
+Отсортированный список ключей (начало каждого слова названия, в нижнем
+регистре): подсказки по префиксу - бинарный поиск и проход по соседним
+ключам, без запроса в БД. Строится при старте приложения и обновляется
+роутерами после записи предприятий и доменов. Как и геоиндекс, у каждого
+процесса свой и перестраивается в фоне, когда table_versions замечает
+запись предприятий или доменов в соседнем процессе.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Optional
+from sqlalchemy.orm import Session
+from server.core.models.domain import Domain
+from server.core.models.enterprise import Enterprise
+
+
+ENTERPRISE_KIND = "enterprise"
+DOMAIN_KIND = "domain"
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+
+
+def normalise(text: str) -> str:
+    return text.casefold().replace("ё", "е")
+
+
+def word_keys(name: str) -> list[str]:
+    """
+    Ключи названия: хвосты, начинающиеся с каждого слова.
+    "Мясной Двор" -> ["мясной двор", "двор"]
+    """
+    text = normalise(name)
+    starts = [i for i, char in enumerate(text) if char.isalnum() and (i == 0 or not text[i - 1].isalnum())]
+    return sorted({text[i:] for i in starts})
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._keys: list[tuple[str, str, int]] = []
+        self._names: dict[tuple[str, int], str] = {}
+        # Изменения (вид, id, название или None), сделанные во время build
+        self._journal: Optional[list[tuple[str, int, Optional[str]]]] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+        self.ready = False
+        self.build_time = 0.0
+
+    def build(self, db: Session):
+        """
+        Полная перестройка по таблицам предприятий и доменов
+        """
+        with self._build_lock:
+            started = time.perf_counter()
+            names = {}
+
+            with self._lock:
+                self._journal = []
+            try:
+                for kind, model in ((ENTERPRISE_KIND, Enterprise), (DOMAIN_KIND, Domain)):
+                    for item_id, name in db.query(model.id, model.name).yield_per(10000):
+                        names[(kind, item_id)] = name
+            finally:
+                with self._lock:
+                    journal, self._journal = self._journal, None
+
+            keys = sorted((key, kind, item_id) for (kind, item_id), name in names.items() for key in word_keys(name))
+
+            with self._lock:
+                self._keys = keys
+                self._names = names
+                # Чтение таблиц могло не увидеть записей, сделанных за это время
+                for kind, item_id, name in journal:
+                    self._apply(kind, item_id, name)
+                self.ready = True
+                self.build_time = time.perf_counter() - started
+
+    def upsert(self, kind: str, item_id: int, name: str):
+        with self._lock:
+            self._apply(kind, item_id, name)
+
+    def remove(self, kind: str, item_id: int):
+        with self._lock:
+            self._apply(kind, item_id, None)
+
+    def _apply(self, kind: str, item_id: int, name: Optional[str]):
+        if self._journal is not None:
+            self._journal.append((kind, item_id, name))
+
+        self._discard(kind, item_id)
+        if name is not None:
+            self._names[(kind, item_id)] = name
+            for key in word_keys(name):
+                insort(self._keys, (key, kind, item_id))
+
+    def _discard(self, kind: str, item_id: int):
+        name = self._names.pop((kind, item_id), None)
+        if name is None:
+            return
+
+        for key in word_keys(name):
+            entry = (key, kind, item_id)
+            i = bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT) -> list[dict]:
+        """
+        До limit названий, в которых какое-либо слово начинается с prefix;
+        в алфавитном порядке совпавшего хвоста
+        """
+        prefix = normalise(prefix.strip())
+        if not prefix:
+            return []
+
+        result = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(result) < limit:
+                key, kind, item_id = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if (kind, item_id) not in seen:
+                    seen.add((kind, item_id))
+                    result.append({"kind": kind, "id": item_id, "name": self._names[(kind, item_id)]})
+                i += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "size": len(self._names),
+                "keys": len(self._keys),
+                "build_time": self.build_time,
+            }
+
+
+suggest_index = SuggestIndex()
@@ -29,7 +29,8 @@ if config.config_file_name is not None:
 target_metadata = Base.metadata
 
 if config.get_main_option("sqlalchemy.url") in ("", None):
-    config.set_main_option("sqlalchemy.url", _build_db_url())
+    # configparser раскрывает %, а в адресе они есть после экранирования пароля
+    config.set_main_option("sqlalchemy.url", _build_db_url().replace("%", "%%"))
 
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,37 @@
+"""Trigram search indexes
+
+Revision ID: 3e7c5a9d1f20
+Revises: 9b4f1e6a2d7c
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e7c5a9d1f20'
+down_revision: Union[str, None] = '9b4f1e6a2d7c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # GIN по триграммам обслуживает ILIKE '%q%' и similarity() для поиска по подстроке
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enterprise_name_trgm "
+            "ON enterprises USING gin (name gin_trgm_ops)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_address_address_trgm "
+            "ON addresses USING gin (address gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_address_address_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_enterprise_name_trgm")
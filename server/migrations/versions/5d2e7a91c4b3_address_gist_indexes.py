@@ -0,0 +1,48 @@
+"""Address GiST indexes
+
+Revision ID: 5d2e7a91c4b3
+Revises: c8860248e9fb
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e7a91c4b3'
+down_revision: Union[str, None] = 'c8860248e9fb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _earthdistance_available() -> bool:
+    return op.get_bind().execute(sa.text(
+        "SELECT count(*) FROM pg_available_extensions WHERE name IN ('cube', 'earthdistance')"
+    )).scalar() == 2
+
+
+def upgrade() -> None:
+    # Индексы для GEO_BACKEND=postgres (см. core/utils/geo.py)
+    earthdistance = _earthdistance_available()
+    if earthdistance:
+        op.execute("CREATE EXTENSION IF NOT EXISTS cube")
+        op.execute("CREATE EXTENSION IF NOT EXISTS earthdistance")
+
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_address_point "
+            "ON addresses USING gist (point(longitude, latitude))"
+        )
+        if earthdistance:
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_address_earth "
+                "ON addresses USING gist (ll_to_earth(latitude, longitude))"
+            )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_address_earth")
+    op.execute("DROP INDEX IF EXISTS idx_address_point")
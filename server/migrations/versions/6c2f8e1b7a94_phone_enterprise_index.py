@@ -0,0 +1,30 @@
+"""Phone enterprise_id index
+
+Revision ID: 6c2f8e1b7a94
+Revises: a41d8f3c6b52
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c2f8e1b7a94'
+down_revision: Union[str, None] = 'a41d8f3c6b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Телефоны предприятия собираются подзапросом по enterprise_id для каждой строки списка
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_phone_enterprise_id "
+            "ON phones (enterprise_id)"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_phone_enterprise_id")
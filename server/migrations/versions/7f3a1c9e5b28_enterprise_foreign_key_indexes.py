@@ -0,0 +1,35 @@
+"""Enterprise address_id and domain_id indexes
+
+Revision ID: 7f3a1c9e5b28
+Revises: e5b9a3c7d210
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3a1c9e5b28'
+down_revision: Union[str, None] = 'e5b9a3c7d210'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Предприятия выбираются по id адресов из геоиндекса и по id доменов поддерева
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enterprise_address_id "
+            "ON enterprises (address_id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enterprise_domain_id "
+            "ON enterprises (domain_id)"
+        )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_enterprise_domain_id")
+    op.execute("DROP INDEX IF EXISTS idx_enterprise_address_id")
@@ -0,0 +1,41 @@
+"""Domain materialized path
+
+Revision ID: 9b4f1e6a2d7c
+Revises: 5d2e7a91c4b3
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4f1e6a2d7c'
+down_revision: Union[str, None] = '5d2e7a91c4b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('domain', sa.Column('path', sa.String(length=1024), nullable=True))
+    op.create_index('idx_domain_parent_id', 'domain', ['parent_id'], unique=False)
+    op.create_index('idx_domain_path', 'domain', ['path'], unique=False,
+                    postgresql_ops={'path': 'text_pattern_ops'})
+
+    # Бэкфилл одним рекурсивным запросом от корней; домены в цикле остаются без path
+    op.execute("""
+        WITH RECURSIVE tree(id, path) AS (
+            SELECT id, '/' || id || '/' FROM domain WHERE parent_id IS NULL
+            UNION ALL
+            SELECT d.id, t.path || d.id || '/' FROM domain d JOIN tree t ON d.parent_id = t.id
+        )
+        UPDATE domain SET path = tree.path FROM tree WHERE domain.id = tree.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_domain_path', table_name='domain')
+    op.drop_index('idx_domain_parent_id', table_name='domain')
+    op.drop_column('domain', 'path')
@@ -0,0 +1,51 @@
+"""Enterprise search vector
+
+Revision ID: a41d8f3c6b52
+Revises: 3e7c5a9d1f20
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41d8f3c6b52'
+down_revision: Union[str, None] = '3e7c5a9d1f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('enterprises', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Бэкфилл до индекса: один UPDATE по всей таблице. Выражение - копия
+    # core.utils.fts.search_document на момент этой ревизии, без моделей приложения
+    op.execute(r"""
+        UPDATE enterprises SET search_vector =
+            setweight(to_tsvector('russian'::regconfig, coalesce(enterprises.name, '')), 'A')
+            || setweight(to_tsvector('russian'::regconfig, coalesce((
+                SELECT addresses.address FROM addresses WHERE addresses.id = enterprises.address_id
+            ), '')), 'B')
+            || setweight(to_tsvector('russian'::regconfig, coalesce((
+                SELECT string_agg(ancestor.name, ' ')
+                FROM domain own JOIN domain ancestor ON own.path LIKE ancestor.path || '%'
+                WHERE own.id = enterprises.domain_id
+            ), '')), 'C')
+            || setweight(to_tsvector('simple'::regconfig, coalesce((
+                SELECT string_agg(regexp_replace(phones.phone, '\D', '', 'g'), ' ')
+                FROM phones WHERE phones.enterprise_id = enterprises.id
+            ), '')), 'D')
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index('idx_enterprise_search_vector', 'enterprises', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_enterprise_search_vector', table_name='enterprises')
+    op.drop_column('enterprises', 'search_vector')
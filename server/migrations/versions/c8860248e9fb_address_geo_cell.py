@@ -0,0 +1,92 @@
+"""Address geo cell
+
+Revision ID: c8860248e9fb
+Revises: 840d452e777f
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8860248e9fb'
+down_revision: Union[str, None] = '840d452e777f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копия кодирования core.utils.geocell на момент этой ревизии, без кода приложения:
+# Z-order код плоских координат EarthRing, CELL_BITS бит на координату
+CELL_BITS = 24
+CELL_SIDE = 1 << CELL_BITS
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _spread(value: int) -> int:
+    result = 0
+    for bit in range(CELL_BITS):
+        result |= ((value >> bit) & 1) << (2 * bit)
+    return result
+
+
+def _quantize(value: float, n: int) -> int:
+    return min(max(int(value / n * CELL_SIDE), 0), CELL_SIDE - 1)
+
+
+def _cell_of(latitude: float, longitude: float) -> int:
+    # Плоская долгота на кольце 360 (180 и -180 склеены в 0), широта на отрезке 180
+    x = (longitude + 180) % 360
+    y = latitude + 90
+    return _spread(_quantize(x, 360)) | (_spread(_quantize(y, 180)) << 1)
+
+
+def _backfill_cells(connection: sa.Connection) -> None:
+    """
+    Пачки по id; соединение в AUTOCOMMIT, каждая пачка фиксируется отдельно
+    """
+    addresses = sa.table(
+        "addresses",
+        sa.column("id", sa.BigInteger),
+        sa.column("latitude", sa.Float),
+        sa.column("longitude", sa.Float),
+        sa.column("cell", sa.BigInteger),
+    )
+    update = (
+        sa.update(addresses)
+        .where(addresses.c.id == sa.bindparam("_id"))
+        .values(cell=sa.bindparam("_cell"))
+    )
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(addresses.c.id, addresses.c.latitude, addresses.c.longitude)
+            .where(addresses.c.cell.is_(None), addresses.c.id > last_id)
+            .order_by(addresses.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+
+        connection.execute(update, [
+            {"_id": address_id, "_cell": _cell_of(latitude, longitude)}
+            for address_id, latitude, longitude in rows
+        ])
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    # Nullable колонка без default добавляется без перезаписи таблицы
+    op.add_column('addresses', sa.Column('cell', sa.BigInteger(), nullable=True))
+
+    # Индекс и бэкфилл вне транзакции: CONCURRENTLY и коммит на каждую пачку
+    with op.get_context().autocommit_block():
+        op.create_index('idx_address_cell', 'addresses', ['cell'], unique=False, postgresql_concurrently=True)
+        _backfill_cells(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('idx_address_cell', table_name='addresses')
+    op.drop_column('addresses', 'cell')
@@ -0,0 +1,36 @@
+"""Table versions
+
+Revision ID: e5b9a3c7d210
+Revises: 6c2f8e1b7a94
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9a3c7d210'
+down_revision: Union[str, None] = '6c2f8e1b7a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Роутеры только увеличивают счетчики, строки должны существовать заранее
+    op.bulk_insert(table_versions, [
+        {'name': 'enterprises', 'version': 0},
+        {'name': 'addresses', 'version': 0},
+        {'name': 'domain', 'version': 0},
+    ])
+
+
+def downgrade() -> None:
+    op.drop_table('table_versions')
@@ -5,6 +5,8 @@
 import random
 from server.core.db import SessionLocal
 from server.core.models import Domain, Enterprise, Address, Phone
+from server.core.utils.etag import TRACKED_TABLES, bump_versions
+from server.core.utils.fts import refresh_search_vectors
 
 BASE_LAT = 55.7558
 BASE_LON = 37.6173
@@ -71,7 +73,7 @@ def seed_data():
 
             domain = Domain(name=domain_data["name"], parent_id=parent_id)
             db.add(domain)
-            db.flush()
+            domain.sync_path()
             domain_map[domain_data["name"]] = domain.id
             print(f"[OK] Домен: {domain_data['name']}")
 
@@ -119,6 +121,8 @@ def seed_data():
             created_count += 1
             print(f"[OK] {companies[i]} -> {address.address}")
 
+        refresh_search_vectors(db)
+        bump_versions(db, *TRACKED_TABLES)
         db.commit()
         print(f"\n=== Создано предприятий: {created_count} ===")
 
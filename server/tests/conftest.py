@@ -0,0 +1,67 @@
+"""
+Общие фикстуры
+
+Интеграционные тесты работают с Postgres из переменных POSTGRES_* (как у
+сервера, миграции применены). Каждый тест идет в транзакции, которая
+откатывается в конце; без доступной БД такие тесты пропускаются.
+"""
+import pytest
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+load_dotenv()
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    try:
+        from server.core.db import engine
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        pytest.skip(f"Postgres недоступен: {e}")
+    return engine
+
+
+@pytest.fixture
+def db(pg_engine):
+    """
+    Сессия внутри внешней транзакции: commit обработчиков фиксирует только
+    точку сохранения, все изменения теста откатываются
+    """
+    connection = pg_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def client(db):
+    """
+    Клиент API на сессии db. Без with: lifespan (миграции, сиды, индексы)
+    не запускается, геопоиск идет через SQL.
+    """
+    from fastapi.testclient import TestClient
+    from server.core.db import get_db
+    from server.core.main import app
+    from server.core.security import API_KEY_NAME, correct_api_key
+    from server.core.utils.domain_tree import domain_tree
+    from server.core.utils.etag import table_versions
+    from server.core.utils.geo_cache import geo_cache
+
+    # Кэши процесса не должны переживать откат транзакции предыдущего теста
+    table_versions.invalidate()
+    domain_tree.bump()
+    geo_cache.clear()
+
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield TestClient(app, headers={API_KEY_NAME: correct_api_key or ""})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
@@ -0,0 +1,19 @@
+"""
+Общие помощники геотестов
+"""
+import math
+from server.core.utils.rings import EARTH_RADIUS
+
+
+def destination(x: float, y: float, distance: float, bearing: float) -> tuple[float, float]:
+    """
+    Точка (широта, долгота) на расстоянии distance метров от (x, y) по азимуту bearing
+    """
+    angle = distance / EARTH_RADIUS
+    lat1, lon1, theta = math.radians(x), math.radians(y), math.radians(bearing)
+    lat2 = math.asin(math.sin(lat1) * math.cos(angle) + math.cos(lat1) * math.sin(angle) * math.cos(theta))
+    lon2 = lon1 + math.atan2(
+        math.sin(theta) * math.sin(angle) * math.cos(lat1),
+        math.cos(angle) - math.sin(lat1) * math.sin(lat2),
+    )
+    return math.degrees(lat2), (math.degrees(lon2) + 180) % 360 - 180
@@ -0,0 +1,60 @@
+"""
+Параметр fields на поисковых маршрутах с ранжированием (/search/, /with_address/, /fts/)
+
+При fields=id запрос строк выбирает одну колонку, а ключ ранга добавляется
+к ней вычисляемой колонкой: пагинация должна вернуть строки, а не голые id.
+"""
+import uuid
+import pytest
+from server.core.models import Address, Enterprise
+
+
+ROWS = 5
+PAGE_LIMIT = 2
+RANKED_ROUTES = ["/api/enterprises/search/", "/api/enterprises/with_address/", "/api/enterprises/fts/"]
+
+
+@pytest.fixture
+def seeded(db) -> tuple[str, set[int]]:
+    """
+    ROWS предприятий по одному адресу; названия и адрес содержат уникальный token
+    """
+    from server.core.utils.fts import refresh_search_vectors
+
+    token = f"fl{uuid.uuid4().hex[:10]}"
+    address = Address(address=f"{token} street", latitude=10.0, longitude=20.0)
+    db.add(address)
+    db.flush()
+    enterprises = [Enterprise(name=f"{token} enterprise {i}", address_id=address.id) for i in range(ROWS)]
+    db.add_all(enterprises)
+    db.flush()
+    refresh_search_vectors(db, Enterprise.address_id == address.id)
+    return token, {enterprise.id for enterprise in enterprises}
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("route", RANKED_ROUTES)
+def test_fields_id_on_ranked_route(route, client, seeded):
+    token, ids = seeded
+    response = client.get(route, params={"q": token, "fields": "id", "limit": ROWS})
+    assert response.status_code == 200, response.text
+    assert all(item.keys() == {"id"} for item in response.json())
+    assert {item["id"] for item in response.json()} == ids
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("route", RANKED_ROUTES)
+def test_fields_id_pages_on_ranked_route(route, client, seeded):
+    token, ids = seeded
+    found, cursor = [], None
+    while True:
+        params = {"q": token, "fields": "id", "limit": PAGE_LIMIT}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = client.get(route, params=params)
+        assert response.status_code == 200, response.text
+        found.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert sorted(found) == sorted(ids)
@@ -0,0 +1,146 @@
+"""
+Записи соседних процессов: table_versions отличает их от своих по выданным
+версиям, индексы перестраиваются в фоне и не теряют своих записей
+"""
+import threading
+import pytest
+from server.core.utils.etag import ADDRESSES_TABLE, DOMAIN_TABLE, ENTERPRISES_TABLE, TableVersionCache
+from server.core.utils.rebuild import BackgroundRebuild
+from server.core.utils.spatial_index import SpatialIndex
+from server.core.utils.suggest import DOMAIN_KIND, ENTERPRISE_KIND, SuggestIndex
+
+
+class VersionsDb:
+    """
+    Сессия, у которой есть только чтение счетчиков table_versions
+    """
+    def __init__(self, **versions: int):
+        self.versions = {ENTERPRISES_TABLE: 0, ADDRESSES_TABLE: 0, DOMAIN_TABLE: 0, **versions}
+
+    def execute(self, statement):
+        return self
+
+    def all(self):
+        return list(self.versions.items())
+
+
+class RowsDb:
+    """
+    Сессия для build: db.query(...).yield_per(...) отдает строки очередной модели
+    """
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def query(self, *columns):
+        return self
+
+    def yield_per(self, size):
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def changes():
+    cache = TableVersionCache(ttl=0)
+    calls = []
+    for table in (ENTERPRISES_TABLE, ADDRESSES_TABLE, DOMAIN_TABLE):
+        cache.on_foreign_change(table, lambda table=table: calls.append(table))
+    return cache, calls
+
+
+@pytest.mark.unit
+def test_first_read_only_remembers_versions(changes):
+    cache, calls = changes
+    cache.get(VersionsDb(addresses=5, domain=2))
+    assert calls == []
+
+
+@pytest.mark.unit
+def test_own_writes_are_not_foreign(changes):
+    cache, calls = changes
+    cache.get(VersionsDb(addresses=5))
+    cache.invalidate([(ADDRESSES_TABLE, 6), (ADDRESSES_TABLE, 7)])
+    cache.get(VersionsDb(addresses=7))
+    assert calls == []
+
+
+@pytest.mark.unit
+def test_foreign_write_calls_handlers(changes):
+    cache, calls = changes
+    cache.get(VersionsDb(addresses=5, domain=1))
+    cache.invalidate([(ADDRESSES_TABLE, 6)])
+    cache.get(VersionsDb(addresses=7, domain=2))
+    assert sorted(calls) == [ADDRESSES_TABLE, DOMAIN_TABLE]
+    assert cache.stats()["foreign_changes"] == 2
+
+
+@pytest.mark.unit
+def test_stale_read_is_ignored(changes):
+    cache, calls = changes
+    cache.get(VersionsDb(enterprises=3))
+    cache.invalidate([(ENTERPRISES_TABLE, 4)])
+    cache.get(VersionsDb(enterprises=4))
+    cache.get(VersionsDb(enterprises=3))
+    cache.get(VersionsDb(enterprises=4))
+    assert calls == []
+
+
+@pytest.mark.unit
+def test_spatial_index_keeps_writes_made_during_build():
+    index = SpatialIndex()
+
+    def rows():
+        yield 1, 10.0, 20.0
+        # Запись этого процесса, пока build читает таблицу
+        index.upsert(2, 10.0, 20.5)
+        index.remove(1)
+        yield 1, 10.0, 20.0
+
+    index.build(RowsDb(rows()))
+    assert set(index.in_frame(9.0, 19.0, 11.0, 21.0)) == {2}
+
+
+@pytest.mark.unit
+def test_suggest_index_keeps_writes_made_during_build():
+    index = SuggestIndex()
+
+    def enterprises():
+        yield 1, "Мясной двор"
+        index.upsert(ENTERPRISE_KIND, 2, "Мясная лавка")
+
+    index.build(RowsDb(enterprises(), iter([(1, "Еда")])))
+    assert [item["id"] for item in index.suggest("мяс")] == [2, 1]
+    assert [item["kind"] for item in index.suggest("еда")] == [DOMAIN_KIND]
+
+
+class CountingIndex:
+    def __init__(self, ready: bool):
+        self.ready = ready
+        self.builds = 0
+        self.built = threading.Event()
+
+    def build(self, db):
+        self.builds += 1
+        self.built.set()
+
+
+class FakeSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.mark.unit
+def test_background_rebuild_skips_index_that_was_never_built():
+    index = CountingIndex(ready=False)
+    BackgroundRebuild("test", index, FakeSession).request()
+    assert index.builds == 0
+
+
+@pytest.mark.unit
+def test_background_rebuild_runs_build():
+    index = CountingIndex(ready=True)
+    BackgroundRebuild("test", index, FakeSession).request()
+    assert index.built.wait(5)
+    assert index.builds == 1
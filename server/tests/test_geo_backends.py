@@ -0,0 +1,160 @@
+"""
+Бэкенды геопоиска: ring и postgres должны находить одни и те же адреса
+
+Точки кругов стоят на 8 азимутах на расстояниях чуть меньше и чуть больше
+радиуса, поэтому плоская проверка в градусах (круг, сжатый по долготе
+на высоких широтах) здесь ловится сразу. Unit-тесты сверяют SQL ring
+(на SQLite), геоиндекс и EarthRing.in_circle с расстоянием по большому
+кругу; интеграционные - ring и postgres на одной БД.
+"""
+import itertools
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from server.core.models.address import Address
+from server.core.utils.geo import POSTGRES_BACKEND, RING_BACKEND, circle_boxes, circle_clause, frame_clause
+from server.core.utils.rings import EarthRing
+from server.core.utils.spatial_index import SpatialIndex
+from server.tests.geo_helpers import destination
+
+
+earth = EarthRing()
+
+# (x, y, r): x - широта, y - долгота центра, r - радиус в метрах
+CIRCLES = {
+    "moscow_1km": (55.7558, 37.6173, 1000),
+    "moscow_20km": (55.7558, 37.6173, 20000),
+    "moscow_500km": (55.7558, 37.6173, 500000),
+    "across_180": (0.0, 179.9, 100000),
+    "north_pole": (89.9, 0.0, 100000),
+    "south_high_latitude": (-70.0, -60.0, 300000),
+}
+BEARINGS = range(0, 360, 45)
+# Доли радиуса: внутри и снаружи у самой границы
+FRACTIONS = (0.0, 0.5, 0.98, 1.02, 1.5)
+
+# (x1, y1, x2, y2): долгота с запада на восток от y1 к y2
+FRAMES = {
+    "moscow": (55.5, 37.3, 56.0, 37.9),
+    "reversed_latitudes": (56.0, 37.3, 55.5, 37.9),
+    "across_180": (10.0, 170.0, 20.0, -170.0),
+    "east_edge_180": (-45.0, 170.0, 45.0, 180.0),
+    "west_edge_minus_180": (-45.0, -180.0, 45.0, -170.0),
+    "antimeridian_only": (-90.0, 180.0, 90.0, 180.0),
+    "north_pole": (80.0, 0.0, 90.0, 10.0),
+    "world": (-90.0, -180.0, 90.0, 180.0),
+}
+LATITUDES = [-90.0, -45.0, 0.0, 15.0, 55.75, 80.0, 90.0]
+LONGITUDES = [-180.0, -175.0, -170.0, -90.0, 0.0, 5.0, 37.6, 170.0, 175.0, 179.99, 180.0]
+
+
+def circle_points() -> list[tuple[float, float]]:
+    return [
+        destination(x, y, r * fraction, bearing)
+        for (x, y, r), bearing, fraction in itertools.product(CIRCLES.values(), BEARINGS, FRACTIONS)
+    ]
+
+
+POINTS = circle_points() + list(itertools.product(LATITUDES, LONGITUDES))
+
+
+def expected_in_circle(circle) -> set[int]:
+    x, y, r = circle
+    center = earth.to_flat((y, x))
+    return {
+        i for i, (latitude, longitude) in enumerate(POINTS, start=1)
+        if earth.distance(earth.to_flat((longitude, latitude)), center) <= r
+    }
+
+
+def add_points(db: Session) -> list[int]:
+    addresses = [
+        Address(address=f"{latitude} {longitude}", latitude=latitude, longitude=longitude)
+        for latitude, longitude in POINTS
+    ]
+    db.add_all(addresses)
+    db.flush()
+    return [address.id for address in addresses]
+
+
+def found(db: Session, ids: list[int], clause) -> set[int]:
+    """
+    Номера точек POINTS (с 1), найденные условием; чужие адреса БД не учитываются
+    """
+    number = {address_id: i for i, address_id in enumerate(ids, start=1)}
+    return {number[address_id] for address_id in db.scalars(select(Address.id).where(clause, Address.id.in_(ids)))}
+
+
+@pytest.fixture(scope="module")
+def sqlite_db():
+    # ring-бэкенд использует floor, sin, cos и radians - они есть в SQLite
+    engine = create_engine("sqlite://")
+    Address.__table__.create(engine)
+    with Session(engine) as db:
+        # BIGINT первичного ключа в SQLite не автоинкрементный: id задаются явно
+        db.add_all(
+            Address(id=i, address=f"{latitude} {longitude}", latitude=latitude, longitude=longitude)
+            for i, (latitude, longitude) in enumerate(POINTS, start=1)
+        )
+        db.commit()
+        yield db, list(range(1, len(POINTS) + 1))
+
+
+@pytest.fixture
+def pg_points(db):
+    return add_points(db)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", CIRCLES)
+def test_earth_ring_in_circle_is_great_circle(name):
+    x, y, r = CIRCLES[name]
+    center = earth.to_flat((y, x))
+    points = earth.to_flat_many([(longitude, latitude) for latitude, longitude in POINTS])
+    mask = earth.in_circle_many(points, r, center)
+    scalar = {i for i, point in enumerate(points.tolist(), start=1) if earth.in_circle(point, r, center)}
+    assert {i for i, inside in enumerate(mask.tolist(), start=1) if inside} == scalar == expected_in_circle(CIRCLES[name])
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", CIRCLES)
+def test_ring_circle_clause(name, sqlite_db):
+    db, ids = sqlite_db
+    assert found(db, ids, circle_clause(*CIRCLES[name], backend=RING_BACKEND)) == expected_in_circle(CIRCLES[name])
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", CIRCLES)
+def test_spatial_index_in_circle(name):
+    index = SpatialIndex()
+    for i, (latitude, longitude) in enumerate(POINTS, start=1):
+        index.upsert(i, latitude, longitude)
+    assert set(index.in_circle(*CIRCLES[name])) == expected_in_circle(CIRCLES[name])
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", CIRCLES)
+def test_circle_boxes_cover_circle(name):
+    boxes = circle_boxes(*CIRCLES[name])
+    for i in expected_in_circle(CIRCLES[name]):
+        latitude, longitude = POINTS[i - 1]
+        lon, lat = earth.to_flat((longitude, latitude))
+        assert any(x0 <= lon <= x1 and y0 <= lat <= y1 for x0, x1, y0, y1 in boxes), (latitude, longitude)
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("name", CIRCLES)
+def test_backends_agree_on_circle(name, db, pg_points):
+    circle = CIRCLES[name]
+    ring = found(db, pg_points, circle_clause(*circle, backend=RING_BACKEND))
+    postgres = found(db, pg_points, circle_clause(*circle, backend=POSTGRES_BACKEND))
+    assert ring == postgres == expected_in_circle(circle)
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("name", FRAMES)
+def test_backends_agree_on_frame(name, db, pg_points):
+    frame = FRAMES[name]
+    ring = found(db, pg_points, frame_clause(*frame, backend=RING_BACKEND))
+    postgres = found(db, pg_points, frame_clause(*frame, backend=POSTGRES_BACKEND))
+    assert ring == postgres
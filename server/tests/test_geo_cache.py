@@ -0,0 +1,112 @@
+"""
+Кэш геопоиска: область-ключ содержит запрошенную область, а ответ
+фильтруется по точным параметрам запроса
+"""
+import random
+import pytest
+from server.core.utils.geo_cache import CIRCLE_KIND, FRAME_KIND, GeoArea, GeoResultCache
+from server.tests.geo_helpers import destination
+
+
+# Точки у края запрошенной области: округление до ближайшего сдвинуло бы край внутрь
+FRAMES = {
+    "moscow": (55.50006, 37.30006, 55.99994, 37.89994),
+    "reversed_latitudes": (55.99994, 37.30006, 55.50006, 37.89994),
+    "across_180": (10.00006, 179.99994, 20.00004, -179.99994),
+    "almost_whole_ring": (-10.0, 10.00004, 10.0, 10.00001),
+    "world": (-90.0, -180.0, 90.0, 180.0),
+}
+CIRCLES = {
+    "moscow_step_radius": (55.75584, 37.61734, 20000.0),
+    "moscow_small": (55.75586, 37.61736, 15.0),
+    "across_180": (0.00004, 179.99996, 1000.0),
+}
+
+random.seed(7)
+POINTS = [(random.uniform(-90, 90), random.uniform(-180, 180)) for _ in range(2000)] + [
+    (latitude + random.uniform(-0.6, 0.6), longitude + random.uniform(-0.6, 0.6))
+    for (latitude, longitude) in [(55.75, 37.6), (15.0, 180.0), (0.0, 10.0), (0.0, 180.0)]
+    for _ in range(2000)
+]
+POINTS = [(max(-90.0, min(90.0, latitude)), (longitude + 180) % 360 - 180) for latitude, longitude in POINTS]
+
+
+def inside(area: GeoArea) -> set[int]:
+    return {i for i, (latitude, longitude) in enumerate(POINTS, start=1) if area.contains(latitude, longitude)}
+
+
+def frame_edge_points(x1: float, y1: float, x2: float, y2: float) -> list[tuple[float, float]]:
+    """
+    Углы рамки и середины ее сторон
+    """
+    middle = (y1 + y2) / 2 if y1 <= y2 else ((y1 + y2 + 360) / 2 + 180) % 360 - 180
+    return [(x, y) for x in (x1, (x1 + x2) / 2, x2) for y in (y1, middle, y2)]
+
+
+def circle_edge_points(x: float, y: float, r: float) -> list[tuple[float, float]]:
+    """
+    Точки у самой границы круга на 16 азимутах
+    """
+    return [destination(x, y, r * 0.9999, bearing) for bearing in range(0, 360, 360 // 16)]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", FRAMES)
+def test_frame_cover_contains_frame(name):
+    area = GeoArea(FRAME_KIND, FRAMES[name])
+    cover = area.cover()
+    assert inside(area) <= inside(cover)
+    assert all(cover.contains(latitude, longitude) for latitude, longitude in frame_edge_points(*FRAMES[name]))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", CIRCLES)
+def test_circle_cover_contains_circle(name):
+    area = GeoArea(CIRCLE_KIND, CIRCLES[name])
+    cover = area.cover()
+    assert inside(area) <= inside(cover)
+    assert all(cover.contains(latitude, longitude) for latitude, longitude in circle_edge_points(*CIRCLES[name]))
+
+
+@pytest.mark.unit
+def test_cover_is_shared_by_nearby_requests():
+    a = GeoArea(FRAME_KIND, (55.50001, 37.30001, 55.99999, 37.89999))
+    b = GeoArea(FRAME_KIND, (55.50009, 37.30009, 55.99991, 37.89991))
+    assert a.cover() == b.cover()
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("area", [GeoArea(FRAME_KIND, frame) for frame in FRAMES.values()] +
+                         [GeoArea(CIRCLE_KIND, circle) for circle in CIRCLES.values()], ids=str)
+def test_cached_ids_are_exact(area):
+    cache = GeoResultCache(size=16, ttl=60, max_ids=len(POINTS))
+    loads = []
+
+    def load(cover: GeoArea, limit: int):
+        loads.append(cover)
+        return [(i, *POINTS[i - 1]) for i in sorted(inside(cover))][:limit]
+
+    for _ in range(2):
+        assert set(cache.ids(area, load)) == inside(area)
+    assert loads == [area.cover()]
+
+
+@pytest.mark.unit
+def test_oversized_cover_is_remembered():
+    cache = GeoResultCache(size=16, ttl=60, max_ids=1)
+    area = GeoArea(FRAME_KIND, FRAMES["world"])
+    loads = []
+
+    def load(cover: GeoArea, limit: int):
+        loads.append(cover)
+        return [(i, *POINTS[i - 1]) for i in range(1, limit + 1)]
+
+    assert cache.ids(area, load) is None
+    assert cache.ids(area, load) is None
+    assert len(loads) == 1
+    assert cache.stats()["oversized"] == 1
+
+    # Запись в области сбрасывает и признак переполнения
+    cache.invalidate_point(*POINTS[0])
+    assert cache.ids(area, load) is None
+    assert len(loads) == 2
@@ -0,0 +1,132 @@
+"""
+Рамки геопоиска: SQL (frame_clause), геоиндекс и EarthRing.in_frame против
+эталона на Ring.in_between - через 180-й меридиан, у полюсов, с углами
+в обратном порядке и на весь мир (-180..180)
+"""
+import itertools
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from server.core.models.address import Address
+from server.core.utils.geo import RING_BACKEND, frame_boxes, frame_clause
+from server.core.utils.rings import EarthRing
+from server.core.utils.spatial_index import SpatialIndex
+
+
+earth = EarthRing()
+
+LATITUDES = [-90.0, -89.5, -45.0, -0.5, 0.0, 10.0, 15.0, 20.0, 55.75, 80.0, 89.99, 90.0]
+LONGITUDES = [-180.0, -179.99, -170.0, -90.0, -0.01, 0.0, 5.0, 10.0, 37.6, 170.0, 175.0, 179.99, 180.0]
+POINTS = list(itertools.product(LATITUDES, LONGITUDES))
+
+# (x1, y1, x2, y2): x - широта, y - долгота; долгота с запада на восток от y1 к y2
+FRAMES = {
+    "moscow": (55.5, 37.3, 56.0, 37.9),
+    "reversed_latitudes": (56.0, 37.3, 55.5, 37.9),
+    "across_180": (10.0, 170.0, 20.0, -170.0),
+    "across_180_reversed_latitudes": (20.0, 170.0, 10.0, -170.0),
+    "east_edge_180": (-45.0, 170.0, 45.0, 180.0),
+    "west_edge_minus_180": (-45.0, -180.0, 45.0, -170.0),
+    "north_pole": (80.0, 0.0, 90.0, 10.0),
+    "south_pole": (-90.0, -10.0, -89.0, 10.0),
+    "pole_to_pole": (-90.0, -90.0, 90.0, -0.01),
+    "world": (-90.0, -180.0, 90.0, 180.0),
+    "world_reversed_latitudes": (90.0, -180.0, -90.0, 180.0),
+    "antimeridian_only": (-90.0, 180.0, 90.0, 180.0),
+}
+
+
+def expected(frame, point) -> bool:
+    """
+    Эталон: широта между углами, долгота по Ring.in_between; -180..180 - все кольцо
+    """
+    x1, y1, x2, y2 = frame
+    latitude, longitude = point
+    south, north = sorted((x1, x2))
+    if not south <= latitude <= north:
+        return False
+    if y2 - y1 >= earth.lon.n:
+        return True
+    return earth.lon.in_between(earth.lon.to_flat(y1), earth.lon.to_flat(longitude), earth.lon.to_flat(y2))
+
+
+def expected_ids(frame) -> set[int]:
+    return {i for i, point in enumerate(POINTS, start=1) if expected(frame, point)}
+
+
+@pytest.fixture(scope="module")
+def addresses_db():
+    # Только таблица адресов: frame_clause ring-бэкенда использует floor, он есть в SQLite
+    engine = create_engine("sqlite://")
+    Address.__table__.create(engine)
+    with Session(engine) as db:
+        db.add_all(
+            Address(id=i, address=f"{latitude} {longitude}", latitude=latitude, longitude=longitude)
+            for i, (latitude, longitude) in enumerate(POINTS, start=1)
+        )
+        db.commit()
+        yield db
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = SpatialIndex()
+    for i, (latitude, longitude) in enumerate(POINTS, start=1):
+        index.upsert(i, latitude, longitude)
+    return index
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", FRAMES)
+def test_earth_ring_in_frame(name):
+    frame = FRAMES[name]
+    corner1, corner2 = earth.frame_corners(*frame)
+    got = {
+        i for i, (latitude, longitude) in enumerate(POINTS, start=1)
+        if earth.in_frame(corner1, earth.to_flat((longitude, latitude)), corner2)
+    }
+    assert got == expected_ids(frame)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", FRAMES)
+def test_earth_ring_in_frame_many(name):
+    frame = FRAMES[name]
+    corner1, corner2 = earth.frame_corners(*frame)
+    points = earth.to_flat_many([(longitude, latitude) for latitude, longitude in POINTS])
+    mask = earth.in_frame_many(corner1, points, corner2)
+    assert {i for i, inside in enumerate(mask.tolist(), start=1) if inside} == expected_ids(frame)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", FRAMES)
+def test_spatial_index_in_frame(name, index):
+    frame = FRAMES[name]
+    assert set(index.in_frame(*frame)) == expected_ids(frame)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", FRAMES)
+def test_ring_frame_clause(name, addresses_db):
+    frame = FRAMES[name]
+    got = set(addresses_db.scalars(select(Address.id).where(frame_clause(*frame, backend=RING_BACKEND))))
+    assert got == expected_ids(frame)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("name", FRAMES)
+def test_frame_boxes_cover_frame(name):
+    frame = FRAMES[name]
+    boxes = frame_boxes(*frame)
+    for i, (latitude, longitude) in enumerate(POINTS, start=1):
+        if i not in expected_ids(frame):
+            continue
+        lon, lat = earth.to_flat((longitude, latitude))
+        # Точка на 180-м меридиане на плоскости - 0, у рамки до 180 она на восточном краю 360
+        lons = (lon, earth.lon.n) if lon == 0 else (lon,)
+        assert any(x0 <= x <= x1 and y0 <= lat <= y1 for x0, x1, y0, y1 in boxes for x in lons), (latitude, longitude)
+
+
+@pytest.mark.unit
+def test_world_frame_is_one_box():
+    assert frame_boxes(*FRAMES["world"]) == [(0, earth.lon.n, 0, earth.lat.n)]
@@ -0,0 +1,166 @@
+"""
+Число SQL-запросов на эндпоинт не зависит от числа строк в ответе
+
+Каждый эндпоинт вызывается на ROW_COUNTS[0] и ROW_COUNTS[1] своих строках,
+запросы считаются слушателем before_cursor_execute. Ленивая загрузка связей
+по строкам (N+1) дает разные числа.
+
+/nearest/ сюда не входит: его цикл расширения радиуса зависит от плотности
+точек, а не от загрузки связей. Потоковая выдача (stream=true) читает через
+собственную сессию и не видит строк откатываемой транзакции теста.
+"""
+import uuid
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from server.core.models import Address, Domain, Enterprise, Phone
+from server.core.models.domain import PATH_SEPARATOR
+from server.core.utils.pagination import encode_cursor
+
+
+ROW_COUNTS = (5, 50)
+PHONES_PER_ENTERPRISE = 2
+
+# Точка в океане, где нет адресов из сидов; x - широта, y - долгота
+LATITUDE, LONGITUDE = -60.5, -150.5
+FRAME = f"x1={LATITUDE - 0.5}&y1={LONGITUDE - 0.5}&x2={LATITUDE + 0.5}&y2={LONGITUDE + 0.5}"
+POLYGON = [
+    [LATITUDE - 0.5, LONGITUDE - 0.5],
+    [LATITUDE - 0.5, LONGITUDE + 0.5],
+    [LATITUDE + 0.5, LONGITUDE + 0.5],
+    [LATITUDE + 0.5, LONGITUDE - 0.5],
+]
+LIMIT = "limit=1000"
+
+# (метод, путь, тело); в пути и теле подставляются id созданных строк и token.
+# Списки всей таблицы читаются с курсора перед первой созданной строкой
+ENDPOINTS = [
+    ("get", "/api/enterprises?cursor={enterprises_cursor}&" + LIMIT, None),
+    ("get", "/api/addresses?cursor={addresses_cursor}&" + LIMIT, None),
+    ("get", "/api/domains?cursor={domains_cursor}&" + LIMIT, None),
+    ("get", "/api/enterprises/search/?q={token}&" + LIMIT, None),
+    ("get", "/api/enterprises/with_address/?q={token}&" + LIMIT, None),
+    ("get", "/api/enterprises/fts/?q={token}&" + LIMIT, None),
+    ("get", "/api/enterprises/at_address/{address}?" + LIMIT, None),
+    ("get", f"/api/enterprises/in_circle/?x={LATITUDE}&y={LONGITUDE}&r=50000&" + LIMIT, None),
+    ("get", f"/api/enterprises/in_frame/?{FRAME}&" + LIMIT, None),
+    ("post", "/api/enterprises/in_polygon/?" + LIMIT, {"points": POLYGON}),
+    ("post", "/api/enterprises/in_areas/", {"areas": [{"type": "circle", "x": LATITUDE, "y": LONGITUDE, "r": 50000}]}),
+    ("get", "/api/enterprises/by_domain/{root}?" + LIMIT, None),
+    ("get", f"/api/enterprises/clusters/?{FRAME}&zoom=10", None),
+    ("get", "/api/addresses/{address}", None),
+    ("get", "/api/addresses/{address}/enterprises", None),
+    ("get", "/api/domains/{root}", None),
+    ("get", f"/api/domains/rollup?{FRAME}", None),
+    ("patch", "/api/domains/{root}", {"name": "{token} renamed"}),
+    ("post", "/api/enterprises", {
+        "name": "{token} created",
+        "address": {"address": "{token} created street", "latitude": LATITUDE, "longitude": LONGITUDE},
+        "phones": ["{token}-created-0", "{token}-created-1"],
+    }),
+    ("put", "/api/enterprises/{enterprise}", {
+        "name": "{token} replaced",
+        "address": {"address": "{token} street", "latitude": LATITUDE, "longitude": LONGITUDE},
+        "phones": ["{token}-replaced-0", "{token}-replaced-1"],
+    }),
+    ("patch", "/api/enterprises/{enterprise}", {"name": "{token} patched"}),
+    ("put", "/api/addresses/{address}", {"address": "{token} moved", "latitude": LATITUDE, "longitude": LONGITUDE + 0.1}),
+]
+
+
+def seed(db: Session, rows: int) -> dict:
+    """
+    Корневой домен с rows дочерними, адрес предприятий и еще rows адресов,
+    rows предприятий с PHONES_PER_ENTERPRISE телефонами; названия содержат уникальный token
+    """
+    from server.core.utils.fts import refresh_search_vectors
+
+    token = f"qc{uuid.uuid4().hex[:10]}"
+    root = Domain(name=f"{token} root")
+    address = Address(address=f"{token} street", latitude=LATITUDE, longitude=LONGITUDE)
+    others = [Address(address=f"{token} street {i}", latitude=LATITUDE, longitude=LONGITUDE) for i in range(rows)]
+    db.add_all([root, address, *others])
+    db.flush()
+    root.path = f"{PATH_SEPARATOR}{root.id}{PATH_SEPARATOR}"
+
+    children = [Domain(name=f"{token} child {i}", parent_id=root.id) for i in range(rows)]
+    db.add_all(children)
+    db.flush()
+    for child in children:
+        child.path = f"{root.path}{child.id}{PATH_SEPARATOR}"
+
+    enterprises = [
+        Enterprise(
+            name=f"{token} enterprise {i}",
+            address_id=address.id,
+            domain_id=children[i].id,
+            phones=[Phone(phone=f"{token}-{i}-{k}") for k in range(PHONES_PER_ENTERPRISE)],
+        )
+        for i in range(rows)
+    ]
+    db.add_all(enterprises)
+    db.flush()
+    refresh_search_vectors(db, Enterprise.address_id == address.id)
+    return {
+        "token": token,
+        "root": root.id,
+        "address": address.id,
+        "enterprise": enterprises[0].id,
+        "enterprises_cursor": encode_cursor([enterprises[0].id - 1]),
+        "addresses_cursor": encode_cursor([min(address.id, others[0].id) - 1]),
+        "domains_cursor": encode_cursor([root.id - 1]),
+    }
+
+
+def fill(value, ids: dict):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    return value
+
+
+@contextmanager
+def counting(engine):
+    count = [0]
+
+    def before_cursor_execute(*args):
+        count[0] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield count
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def count_queries(pg_engine, db: Session, client, method: str, path: str, body) -> int:
+    from server.core.utils.domain_tree import domain_tree
+    from server.core.utils.etag import table_versions
+    from server.core.utils.geo_cache import geo_cache
+
+    # Одинаковое состояние кэшей процесса перед каждым замером: счетчики таблиц
+    # читаются заново (версия доменов уже сверена), геокэш пуст, снимок дерева теплый
+    table_versions.get(db)
+    table_versions.invalidate()
+    geo_cache.clear()
+    domain_tree.bump()
+    domain_tree.get(db)
+
+    with counting(pg_engine) as count:
+        response = client.request(method, path, json=body)
+    assert response.status_code < 300, (path, response.status_code, response.text[:300])
+    return count[0]
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("method, path, body", ENDPOINTS, ids=[f"{m} {p}" for m, p, _ in ENDPOINTS])
+def test_query_count_does_not_depend_on_rows(method, path, body, pg_engine, db, client):
+    counts = []
+    for rows in ROW_COUNTS:
+        ids = seed(db, rows)
+        counts.append(count_queries(pg_engine, db, client, method, fill(path, ids), fill(body, ids)))
+    assert counts[0] == counts[1], dict(zip(ROW_COUNTS, counts))